@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import stats
+
+LOOKBACK = 6
+ALPHA    = 0.05
+
+RESULT_COLUMNS = ["last", "mean_prev", "p_value", "is_anomaly"]
+
+
+def drop_anomaly(series: pd.Series, lookback: int = LOOKBACK):
+    """
+    The notebooks' test of the last point of series against the lookback points before it.
+    Row at a time, kept as the reference for drop_anomalies.
+    """
+    if len(series) < lookback + 1:
+        return
+
+    y_last = series.iloc[-1]
+    baseline = series.iloc[-lookback-1:-1]
+
+    # Simple one sided t-test
+    mean = baseline.mean()
+    sd = baseline.std()
+    n  = len(baseline)
+    error = sd / np.sqrt(n)
+
+    t_stat = (y_last - mean) / error
+    p_val  = stats.t.cdf(t_stat, df=n-1)
+
+    return dict(last=y_last,
+                mean_prev=mean,
+                p_value=p_val,
+                is_anomaly=p_val < 0.05)
+
+
+def rolling_drop_test(values: np.ndarray, position: np.ndarray, lookback: int = LOOKBACK, alpha: float = ALPHA):
+    """
+    One-sided t-test of every point against the lookback points before it, for many series laid
+    end to end. position is each point's index within its own series, windows never cross into
+    the previous series. Returns (mean_prev, p_value, is_anomaly), NaN / False for the first
+    lookback points of a series.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    mean   = np.full(len(values), np.nan)
+    p      = np.full(len(values), np.nan)
+
+    tested = np.flatnonzero(np.asarray(position) >= lookback)
+    if len(tested):
+        # windows[j] is values[j : j + lookback], the baseline of point i starts at i - lookback
+        baseline = sliding_window_view(values, lookback)[tested - lookback]
+        mean[tested] = baseline.mean(axis=1)
+        error = baseline.std(axis=1, ddof=1) / np.sqrt(lookback)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # A flat baseline gives +-inf like the row-wise version, p 0 or 1
+            p[tested] = stats.t.cdf((values[tested] - mean[tested]) / error, df=lookback - 1)
+    return mean, p, p < alpha
+
+
+def drop_anomalies(data: pd.Series | pd.DataFrame, value: str | None = None, by=None, on: str | None = None,
+                   lookback: int = LOOKBACK, alpha: float = ALPHA) -> pd.DataFrame:
+    """
+    drop_anomaly for every point of one or many series in a single vectorized pass.
+
+    data is a Series (one series in index order) or a long DataFrame with a value column, by
+    (column or list of columns, one series per group, e.g. Country or Website Buying Power) and
+    on (the time column the series are ordered by, row order within a group if None). Returns a
+    tidy frame aligned with data: the by / on columns, then last, mean_prev, p_value, is_anomaly.
+
+    The baseline is the lookback rows before each point, so every series has to be gap-free on on:
+    periods with no events need a row with 0 (a GROUP BY leaves them out), otherwise the window
+    reaches further back in time and a drop to zero is never tested.
+    """
+    if isinstance(data, pd.Series):
+        frame, value, by, on = data.rename("last").to_frame(), "last", None, None
+    else:
+        frame = data
+    by = [by] if isinstance(by, str) else list(by or [])
+
+    columns = by + ([on] if on else [])
+    order   = np.arange(len(frame))
+    if columns:
+        # Sort by group, then time, on one combined integer key (several times faster than lexsort),
+        # input that already comes in that order, like a groupby result, is not sorted again
+        codes = [pd.factorize(frame[c], sort=True) for c in columns]
+        if np.prod([float(len(u) + 1) for _, u in codes]) < 2 ** 62:
+            key = np.zeros(len(frame), dtype=np.int64)
+            for c, u in codes:
+                key = key * (len(u) + 1) + c + 1
+            if (np.diff(key) < 0).any():
+                order = np.argsort(key, kind="stable")
+        else:
+            order = np.lexsort([c for c, _ in reversed(codes)])
+
+    ordered  = frame.iloc[order]
+    position = ordered.groupby(by, sort=False, dropna=False).cumcount().to_numpy() if by else np.arange(len(frame))
+    mean, p, flag = rolling_drop_test(ordered[value].to_numpy(), position, lookback, alpha)
+
+    # Back to the caller's row order
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    out = pd.DataFrame(index=frame.index) if isinstance(data, pd.Series) else frame[columns].copy()
+    out["last"]       = frame[value].to_numpy()
+    out["mean_prev"]  = mean[inverse]
+    out["p_value"]    = p[inverse]
+    out["is_anomaly"] = flag[inverse]
+    return out
@@ -0,0 +1,82 @@
+import argparse
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from anomaly import LOOKBACK, drop_anomalies, drop_anomaly
+
+# (series, points per series): monthly per country/bucket style, and daily series
+SHAPES = ((5_000, 30), (5_000, 365))
+LOOP_SERIES = 50   # the row-wise loop is timed on a few series and scaled up
+
+
+def make_series(n_series: int, points: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Long frame of n_series Poisson count series with a few injected drops, rows shuffled
+    """
+    rng    = np.random.default_rng(seed)
+    level  = rng.integers(20, 5_000, n_series)
+    counts = rng.poisson(np.repeat(level, points)).astype(np.float64)
+    drops  = rng.random(len(counts)) < 0.01
+    counts[drops] *= 0.5
+    df = pd.DataFrame({
+        "series": np.repeat(np.arange(n_series), points),
+        "day": np.tile(pd.date_range("2020-01-01", periods=points, freq="D"), n_series),
+        "signups": counts,
+    })
+    return df.sample(frac=1, random_state=seed, ignore_index=True)
+
+
+def notebook_loop(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    What the notebooks did, per series: drop_anomaly on every prefix
+    """
+    rows = []
+    for key, group in df.sort_values(["series", "day"]).groupby("series"):
+        series = group.set_index("day")["signups"]
+        for i in range(len(series)):
+            result = drop_anomaly(series[:i+1], lookback=LOOKBACK)
+            rows.append((key, series.index[i], np.nan if result is None else result["p_value"],
+                         bool(result and result["is_anomaly"])))
+    return pd.DataFrame(rows, columns=["series", "day", "p_value", "is_anomaly"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-wise loop against the vectorized drop anomaly test")
+    parser.add_argument("--loop-series", type=int, default=LOOP_SERIES)
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", RuntimeWarning)   # flat baselines divide by zero in the loop
+
+    ok = True
+    print(f"{'series':>8}{'points':>8}  {'implementation':<34}{'seconds':>10}{'points/sec':>14}")
+    for n_series, points in SHAPES:
+        df     = make_series(n_series, points)
+        sample = df[df["series"] < args.loop_series]
+
+        start = time.perf_counter()
+        expected = notebook_loop(sample)
+        loop = (time.perf_counter() - start) * n_series / args.loop_series
+
+        start = time.perf_counter()
+        result = drop_anomalies(df, value="signups", by="series", on="day")
+        vectorized = time.perf_counter() - start
+
+        got = result[df["series"] < args.loop_series].sort_values(["series", "day"], ignore_index=True)
+        same = np.allclose(got["p_value"], expected["p_value"], equal_nan=True) and \
+               (got["is_anomaly"].to_numpy() == expected["is_anomaly"].to_numpy()).all()
+        ok = ok and same
+
+        total = n_series * points
+        for name, seconds in ((f"notebook loop (from {args.loop_series} series)", loop), ("drop_anomalies", vectorized)):
+            print(f"{n_series:>8,}{points:>8}  {name:<34}{seconds:>10.2f}{total / seconds:>14,.0f}")
+        print(f"{'':>18}parity on {args.loop_series} series: {'identical' if same else 'MISMATCH'}, "
+              f"{int(result['is_anomaly'].sum()):,} anomalies flagged")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from bench_enrichment import EDGE_CASES
+from datagen import write_customers_csv
+from duckdb_views import buying_power_by_year, country_counts, create_views, insights, monthly_signups
+from enrichment import PHONE_COLUMNS, enrich_customers
+from pipeline import enrich_csv_to_parquet
+
+SIZES = (2_000_000, 8_000_000)
+HERE  = os.path.dirname(os.path.abspath(__file__))
+
+ENRICHED_COLUMNS = [f"{c} {part}" for c in PHONE_COLUMNS for part in ("CC", "Standard")] + \
+                   ["Website Domain", "Website TLD", "Website Buying Power"]
+
+# All three insights in one scan over the views, only the aggregate rows come back to Python
+DUCKDB_RUN = """
+import sys, time
+from duckdb_views import create_views, insights
+from pipeline import peak_rss_mb
+start = time.perf_counter()
+monthly, countries, mix = insights(create_views(sys.argv[1]))
+elapsed = time.perf_counter() - start
+rows = int(monthly.sum())
+print(f"rows={rows} seconds={elapsed:.2f} rows_per_sec={rows / elapsed:.0f} peak_rss_mb={peak_rss_mb():.0f}")
+"""
+
+# The notebook before: full pd.read_csv, pandas enrichment, groupby / value_counts / crosstab
+PANDAS_RUN = """
+import sys, time, pandas as pd
+from enrichment import enrich_customers
+from pipeline import peak_rss_mb
+start = time.perf_counter()
+df = enrich_customers(pd.read_csv(sys.argv[1]))
+monthly = df.groupby(df["Subscription Date"].dt.to_period("M")).size()
+countries = df["Country"].value_counts()
+mix = pd.crosstab(df["Subscription Date"].dt.year, df["Website Buying Power"])
+elapsed = time.perf_counter() - start
+print(f"rows={len(df)} seconds={elapsed:.2f} rows_per_sec={len(df) / elapsed:.0f} peak_rss_mb={peak_rss_mb():.0f}")
+"""
+
+
+def same(left: pd.DataFrame | pd.Series, right: pd.DataFrame | pd.Series) -> bool:
+    return left.astype(str).to_numpy().tolist() == right.astype(str).to_numpy().tolist() and \
+           list(map(str, left.index)) == list(map(str, right.index))
+
+
+def check_parity(path: str, parquet: str) -> bool:
+    """
+    The SQL enrichment and insights against enrichment.py and the notebook's pandas versions, over
+    the CSV and over its pipeline.py Parquet dataset (passed through, not enriched again)
+    """
+    ok = True
+
+    con = create_views(path)
+    con.register("edge", EDGE_CASES.astype(str).where(EDGE_CASES.notna()))
+    edge = con.execute("""
+        SELECT phone_cc("Phone 1"), phone_std("Phone 1"), phone_cc("Phone 2"), phone_std("Phone 2"),
+               website_host(website_clean("Website")) AS host, website_tld(host) AS tld, buying_power(tld)
+        FROM edge
+    """).df()
+    edge.columns = ENRICHED_COLUMNS
+    ok = same(edge, enrich_customers(EDGE_CASES, date_col=None)[ENRICHED_COLUMNS]) and ok
+    print(f"parity edge cases: {'identical' if ok else 'MISMATCH'}")
+
+    sql = con.execute('SELECT * FROM customers_enriched ORDER BY "Index"').df()
+    df  = enrich_customers(pd.read_csv(path))
+    columns = ENRICHED_COLUMNS + ["Subscription Date"]
+    checks = {
+        f"enriched columns ({len(df):,} rows)": (sql[columns].assign(**{"Subscription Date": pd.to_datetime(sql["Subscription Date"])}), df[columns]),
+        "monthly signups": (monthly_signups(con), df.groupby(df["Subscription Date"].dt.to_period("M")).size()),
+        "country counts": (country_counts(con).sort_index(), df["Country"].value_counts().sort_index()),
+        "buying power by year": (buying_power_by_year(con), pd.crosstab(df["Subscription Date"].dt.year, df["Website Buying Power"])),
+    }
+    single_pass = insights(con)
+    for i, name in enumerate(["monthly signups", "country counts", "buying power by year"]):
+        got = single_pass[i].sort_index() if name == "country counts" else single_pass[i]
+        checks[f"{name} (single pass)"] = (got, checks[name][1])
+
+    enrich_csv_to_parquet(path, parquet, overwrite=True)
+    pcon = create_views(parquet)
+    view_columns = [name for name, *_ in pcon.execute("DESCRIBE customers_enriched").fetchall()]
+    checks["parquet view columns"] = (pd.Series(sorted(view_columns)), pd.Series(sorted(set(view_columns))))
+    psql = pcon.execute('SELECT * FROM customers_enriched ORDER BY "Index"').df()
+    checks["enriched columns (parquet)"] = (psql[columns].assign(**{"Subscription Date": pd.to_datetime(psql["Subscription Date"])}), df[columns])
+    single_pass = insights(pcon)
+    for i, name in enumerate(["monthly signups", "country counts", "buying power by year"]):
+        got = single_pass[i]
+        checks[f"{name} (parquet)"] = (got.sort_index() if name == "country counts" else got, checks[name][1])
+
+    for name, (got, expected) in checks.items():
+        match = same(got, expected)
+        print(f"parity {name}: {'identical' if match else 'MISMATCH'}")
+        ok = ok and match
+    return ok
+
+
+def run(*args) -> dict:
+    out = subprocess.run([sys.executable, *args], cwd=HERE, capture_output=True, text=True, check=True).stdout
+    return {k: float(v) for k, v in (pair.split("=") for pair in out.strip().splitlines()[-1].split())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity and cost of the DuckDB enrichment and insight views")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--pandas-max", type=int, default=2_000_000, help="largest size to also run through pandas")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = os.path.join(tmp, "sample.csv")
+        write_customers_csv(sample, 200_000, seed=7)
+        ok = check_parity(sample, os.path.join(tmp, "sample_parquet") + "/")
+
+        print(f"\n{'rows':>12}  {'implementation':<26}{'seconds':>10}{'rows/sec':>14}{'peak RSS MB':>14}")
+        for n in args.sizes:
+            path    = os.path.join(tmp, f"customers-{n}.csv")
+            parquet = os.path.join(tmp, "parquet") + "/"
+            write_customers_csv(path, n)
+            # The Parquet dataset is enriched once by pipeline.py, the views only read its columns
+            runs = [("duckdb views over CSV", run("-c", DUCKDB_RUN, path)),
+                    ("pipeline.py CSV -> Parquet", run("pipeline.py", path, parquet, "--overwrite", "--quiet")),
+                    ("duckdb views over Parquet", run("-c", DUCKDB_RUN, parquet))]
+            if n <= args.pandas_max:
+                runs.append(("pandas full load", run("-c", PANDAS_RUN, path)))
+            for name, r in runs:
+                print(f"{n:>12,}  {name:<26}{r['seconds']:>10.2f}{r['rows_per_sec']:>14,.0f}{r['peak_rss_mb']:>14,.0f}")
+            os.remove(path)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
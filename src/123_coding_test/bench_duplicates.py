@@ -0,0 +1,103 @@
+import argparse
+import sys
+import time
+
+import duckdb as db
+import pandas as pd
+
+from datagen import make_customers
+from duplicates import DUPLICATE_KEYS, key_sql, profile_duplicates
+
+SIZES = (200_000, 2_000_000)
+TOP_N = 5
+
+
+def key_series(df: pd.DataFrame, cols) -> pd.Series:
+    return df[cols[0]] if len(cols) == 1 else df[cols[0]].str.strip() + " " + df[cols[1]].str.strip()
+
+
+def pandas_per_key(df: pd.DataFrame, keys: dict = DUPLICATE_KEYS, top_n: int = TOP_N) -> dict:
+    """
+    1_parse_small's duplicate_summary, one pass over the frame per key, NULL keys dropped
+    """
+    out = {}
+    for label, cols in keys.items():
+        series = key_series(df, cols).dropna()
+        dup_series = series[series.duplicated(keep=False)]
+        dup_counts = dup_series.value_counts()
+        out[label] = (len(dup_counts), len(dup_series), dup_counts.head(top_n).tolist())
+    return out
+
+
+def duckdb_per_key(con, keys: dict = DUPLICATE_KEYS, top_n: int = TOP_N) -> dict:
+    """
+    2_parse_big's duplicate_summary, two GROUP BY scans per key, NULL keys dropped
+    """
+    out = {}
+    for label, cols in keys.items():
+        dups = f"SELECT {key_sql(cols)} AS key, COUNT(*) cnt FROM customers WHERE key IS NOT NULL GROUP BY key HAVING cnt > 1"
+        grp_cnt, row_cnt = con.execute(f"SELECT COUNT(*), SUM(cnt) FROM ({dups})").fetchone()
+        top = con.execute(f"SELECT cnt FROM ({dups}) ORDER BY cnt DESC LIMIT {top_n}").fetchall()
+        out[label] = (grp_cnt, int(row_cnt or 0), [c for (c,) in top])
+    return out
+
+
+def from_profile(summary: pd.DataFrame, top: pd.DataFrame) -> dict:
+    return {label: (int(row.duplicate_groups), int(row.rows_involved), top.loc[top["label"] == label, "count"].tolist())
+            for label, row in summary.iterrows()}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity and cost of the single-pass duplicate profiler")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    args = parser.parse_args()
+
+    ok = True
+    print(f"{'rows':>12}  {'implementation':<32}{'seconds':>10}")
+    for n in args.sizes:
+        df  = make_customers(n)
+        con = db.connect()
+        con.execute("CREATE TABLE customers AS SELECT * FROM df")
+
+        runs = {
+            "pandas, per key": timed(pandas_per_key, df),
+            "duckdb, two scans per key": timed(duckdb_per_key, con),
+            "profiler exact, one scan": timed(profile_duplicates, "customers", con=con),
+            "profiler approximate, one scan": timed(profile_duplicates, "customers", con=con, approximate=True),
+        }
+        for name, (seconds, _) in runs.items():
+            print(f"{n:>12,}  {name:<32}{seconds:>10.2f}")
+
+        expected = runs["pandas, per key"][1]
+        exact    = from_profile(*runs["profiler exact, one scan"][1])
+        for label in DUPLICATE_KEYS:
+            same = expected[label] == exact[label] == runs["duckdb, two scans per key"][1][label]
+            ok = ok and same
+            if not same:
+                print(f"  MISMATCH {label}: pandas {expected[label]}, profiler {exact[label]}")
+
+        # Approximate against exact: distinct count error, and how many of the approximate top keys
+        # really are as repeated as the exact top_n-th key (ties make the exact keys themselves ambiguous)
+        summary, top = runs["profiler exact, one scan"][1]
+        approx_summary, approx_top = runs["profiler approximate, one scan"][1]
+        for label, cols in DUPLICATE_KEYS.items():
+            distinct, estimate = summary.loc[label, "distinct"], approx_summary.loc[label, "distinct"]
+            counts  = key_series(df, cols).value_counts()
+            cutoff  = top.loc[top["label"] == label, "count"].min()
+            guessed = approx_top.loc[approx_top["label"] == label, "key"]
+            hits    = int((counts.reindex(guessed).fillna(0) >= cutoff).sum()) if pd.notna(cutoff) else 0
+            print(f"{'':>14}{label:<16} distinct {distinct:>10,} est {estimate:>10,} ({(estimate - distinct) / max(distinct, 1):+.2%})"
+                  f"  top-{TOP_N} hits {hits}/{len(guessed)}")
+
+    print("parity exact profiler: " + ("identical to the per-key versions" if ok else "MISMATCH"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from datagen import make_customers
+from enrichment import PREMIUM_TLDS, MID_TLDS, enrich_customers, enrich_customers_rowwise, parity_mismatches
+
+SIZES          = (100_000, 2_000_000)
+ROWWISE_SAMPLE = 20_000   # the row-wise reference is timed on a sample, it would take minutes at 2M
+
+# Formats and malformed values beyond what the synthetic generator produces
+EDGE_CASES = pd.DataFrame({
+    "Phone 1": ["+1-541-754-3010", "001-599-042-7428x143", "0044 20 7946 0958 ext. 12", "(211)994-5012",
+                "  397.884.0519X718 ", None, "", "+(12) 345", "0123456", "+12345678", "12 EXT5", "ext"],
+    "Phone 2": [5551234567, None, "+62 812-3456-789", "00", "+", "x12", "1x2x3", "999", "+1", "001", "0012", "abc"],
+    "Website": ["http://www.stephenson.com/", "HTTPS://User@Example.AI:443/path", "www.no-scheme.com",
+                "ftp://files.example.IO", "http://localhost", "http://[::1]:80/", None, "  ", "//cdn.example.net/x",
+                "http://a.b.c.xyz?q=1", "mailto:x@y.com", "http://user:pw@host.co.uk/"],
+}).astype(object)
+
+
+def notebook_vectorized(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The str-accessor version from 2_parse_big.ipynb (prefix fixed to 00), for comparison
+    """
+    df = df.copy()
+    for col in ("Phone 1", "Phone 2"):
+        s  = df[col].fillna("").str.strip()
+        cc = s.str.extract(r'^\+(\d{1,3})').fillna(s.str.extract(r'^00(\d{1,3})')).fillna("")[0]
+        body = (
+            s.str.replace(r'^\+\d{1,3}|^00\d{1,3}', '', regex=True)
+             .str.split(r'(?:ext\.?|x)', n=1, expand=True, regex=True)[0]
+             .str.replace(r'\D', '', regex=True)
+        )
+        df[f"{col} CC"] = cc
+        df[f"{col} Standard"] = body
+
+    hosts = df["Website"].fillna("").str.extract(r'https?://([^/]+)')[0].str.lower()
+    tlds  = hosts.str.extract(r'\.([a-z0-9]+)$')[0].fillna("")
+    df["Website Domain"] = hosts
+    df["Website TLD"] = tlds
+    df["Website Buying Power"] = np.select(
+        [tlds.isin(PREMIUM_TLDS), tlds.isin(MID_TLDS), tlds != ""], ["premium", "mid", "budget"], default="unknown"
+    )
+    return df
+
+
+def check_parity(df: pd.DataFrame, label: str) -> bool:
+    mismatches = parity_mismatches(df)
+    if not mismatches:
+        print(f"parity {label}: {len(df):,} rows identical to the row-wise reference")
+        return True
+    for col, rows in mismatches.items():
+        print(f"parity {label}: {len(rows):,} mismatches in {col}")
+        print(rows.head(10).to_string())
+    return False
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity and throughput of the customer enrichment")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    args = parser.parse_args()
+
+    ok = check_parity(EDGE_CASES, "edge cases")
+    ok = check_parity(make_customers(ROWWISE_SAMPLE, seed=1), "synthetic") and ok
+
+    print(f"\n{'rows':>10}  {'implementation':<28}{'seconds':>10}{'rows/sec':>14}")
+    for n in args.sizes:
+        df    = make_customers(n)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sample = df.head(ROWWISE_SAMPLE)
+
+        runs = [
+            (f"row-wise .apply ({len(sample):,} sample)", len(sample), timed(enrich_customers_rowwise, sample)),
+            ("notebook str accessors", n, timed(notebook_vectorized, df)),
+            ("enrich_customers pandas", n, timed(enrich_customers, df)),
+            ("enrich_customers pyarrow", n, timed(enrich_customers, table)),
+        ]
+        for name, rows, seconds in runs:
+            print(f"{n:>10,}  {name:<28}{seconds:>10.2f}{rows / seconds:>14,.0f}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
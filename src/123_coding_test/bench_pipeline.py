@@ -0,0 +1,81 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from datagen import write_customers_csv
+from enrichment import enrich_customers
+from pipeline import enrich_csv_to_parquet
+
+SIZES = (1_000_000, 4_000_000, 8_000_000)
+HERE  = os.path.dirname(os.path.abspath(__file__))
+
+# What the notebook did: one full pd.read_csv, then the enrichment on the whole frame
+FULL_LOAD = """
+import sys, time, pandas as pd
+from enrichment import enrich_customers
+from pipeline import peak_rss_mb
+start = time.perf_counter()
+df = enrich_customers(pd.read_csv(sys.argv[1]))
+elapsed = time.perf_counter() - start
+print(f"rows={len(df)} seconds={elapsed:.2f} rows_per_sec={len(df) / elapsed:.0f} peak_rss_mb={peak_rss_mb():.0f}")
+"""
+
+
+def check_aggregates(path: str, out_dir: str) -> bool:
+    """
+    The streamed aggregates against the notebook's pandas versions on a full load
+    """
+    aggs = enrich_csv_to_parquet(path, out_dir, batch_rows=30_000, overwrite=True)
+    df   = enrich_customers(pd.read_csv(path))
+    checks = {
+        "monthly signups": (aggs.monthly_signups(), df.groupby(df["Subscription Date"].dt.to_period("M")).size()),
+        "country counts": (aggs.country_counts().sort_index(), df["Country"].value_counts().sort_index()),
+        "buying power by year": (aggs.buying_power_by_year(),
+                                 pd.crosstab(df["Subscription Date"].dt.year, df["Website Buying Power"])),
+    }
+    ok = True
+    for name, (streamed, full) in checks.items():
+        same = streamed.to_numpy().tolist() == full.to_numpy().tolist() and list(map(str, streamed.index)) == list(map(str, full.index))
+        print(f"aggregates {name}: {'identical' if same else 'MISMATCH'}")
+        ok = ok and same
+    rows = sum(len(pd.read_parquet(os.path.join(out_dir, d))) for d in os.listdir(out_dir))
+    print(f"parquet rows: {rows:,} of {len(df):,}")
+    return ok and rows == len(df)
+
+
+def run(*args) -> dict:
+    out = subprocess.run([sys.executable, *args], cwd=HERE, capture_output=True, text=True, check=True).stdout
+    return {k: float(v) for k, v in (pair.split("=") for pair in out.strip().splitlines()[-1].split())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and peak memory of the streaming enrichment pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--full-load-max", type=int, default=4_000_000, help="largest size to also run through pd.read_csv")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = os.path.join(tmp, "sample.csv")
+        write_customers_csv(sample, 200_000, seed=7)
+        ok = check_aggregates(sample, os.path.join(tmp, "sample_parquet"))
+
+        print(f"\n{'rows':>12}  {'implementation':<26}{'seconds':>10}{'rows/sec':>12}{'peak RSS MB':>14}")
+        for n in args.sizes:
+            path = os.path.join(tmp, f"customers-{n}.csv")
+            write_customers_csv(path, n)
+            runs = [("streaming pipeline", run("pipeline.py", path, os.path.join(tmp, "out"), "--overwrite", "--quiet"))]
+            if n <= args.full_load_max:
+                runs.append(("read_csv + enrich", run("-c", FULL_LOAD, path)))
+            for name, r in runs:
+                print(f"{n:>12,}  {name:<26}{r['seconds']:>10.2f}{r['rows_per_sec']:>12,.0f}{r['peak_rss_mb']:>14,.0f}")
+            os.remove(path)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Same layout as the customers-100000.csv / customers-2000000.csv files the notebooks read
+COLUMNS = ["Index", "Customer Id", "First Name", "Last Name", "Company", "City", "Country",
+           "Phone 1", "Phone 2", "Email", "Subscription Date", "Website"]
+
+FIRST_NAMES = ["Sheryl", "Preston", "Roy", "Linda", "Joanna", "Aimee", "Darren", "Brett", "Natalie", "Kristin",
+               "Faith", "Miguel", "Tina", "Dominique", "Jared", "Chelsea", "Shane", "Clarence", "Kayla", "Brent"]
+LAST_NAMES  = ["Baxter", "Lozano", "Berry", "Mcmahon", "Matthews", "Holt", "Rowe", "Lam", "Weeks", "Dean",
+               "Wheeler", "Greene", "Pena", "Stephenson", "Adkins", "Brock", "Mccarty", "Hull", "Cortez", "Fry"]
+COMPANIES   = ["Rasmussen Group", "Vega-Gentry", "Murillo-Perry", "Dominguez, Mcmillan and Donovan", "Lam Group",
+               "Martin Ltd", "Steele-Kirk", "Hull Inc", "Cortez-Dean", "Fry, Weeks and Rowe"]
+CITIES      = ["East Leonard", "East Jimmychester", "Isabelborough", "Bensonview", "West Priscilla",
+               "North Clarence", "Port Aimee", "South Tina", "Lake Brent", "New Kayla"]
+COUNTRIES   = ["Congo", "Korea", "Saudi Arabia", "Chile", "Djibouti", "Antigua and Barbuda", "Dominican Republic",
+               "Slovakia (Slovak Republic)", "Bosnia and Herzegovina", "Pitcairn Islands", "Bulgaria", "Cyprus",
+               "Timor-Leste", "Guernsey", "Vietnam", "Togo", "Sri Lanka", "Peru", "Oman", "Norway"]
+# Skewed like the real file, a handful of countries dominate
+COUNTRY_WEIGHTS = np.linspace(2, 0.5, len(COUNTRIES)) / np.linspace(2, 0.5, len(COUNTRIES)).sum()
+# Plus a few the bucket logic treats as budget or unknown
+TLDS        = ["com", "net", "org", "info", "biz", "io", "co", "xyz", "ai", "me"]
+TLD_WEIGHTS = [0.40, 0.20, 0.18, 0.08, 0.08, 0.02, 0.01, 0.01, 0.01, 0.01]
+
+START_DATE = np.datetime64("2020-01-01")
+DAYS       = 882   # through 2022-05-31
+
+
+def _join(*parts):
+    return pc.binary_join_element_wise(*parts, "")
+
+
+def _pick(rng, values: list, n: int, p=None) -> pa.Array:
+    return pa.array(values).take(rng.choice(len(values), n, p=p))
+
+
+def _digits(rng, n: int, width: int) -> pa.Array:
+    # Offset by 10**width and drop the leading 1, zero padding without a per-row zfill
+    return pc.utf8_slice_codeunits(pa.array(rng.integers(0, 10 ** width, n) + 10 ** width).cast(pa.string()), 1)
+
+
+def _phones(rng, n: int) -> pa.Array:
+    """
+    The formats Faker writes for en_US: dotted, dashed, (area), bare digits, +1- and 001- prefixes,
+    each optionally with an xNNN extension
+    """
+    area, mid, last = _digits(rng, n, 3), _digits(rng, n, 3), _digits(rng, n, 4)
+    variants = [
+        _join(area, ".", mid, ".", last),
+        _join(area, "-", mid, "-", last),
+        _join("(", area, ")", mid, "-", last),
+        _join(area, mid, last),
+        _join("+1-", area, "-", mid, "-", last),
+        _join("001-", area, "-", mid, "-", last),
+    ]
+    phones  = pc.choose(pa.array(rng.integers(0, len(variants), n)), *variants)
+    has_ext = pa.array(rng.random(n) < 0.3)
+    return pc.if_else(has_ext, _join(phones, "x", _digits(rng, n, 3)), phones)
+
+
+def make_customers(n: int, seed: int = 0, start_index: int = 1) -> pd.DataFrame:
+    rng   = np.random.default_rng(seed)
+    first = _pick(rng, FIRST_NAMES, n)
+    last  = _pick(rng, LAST_NAMES, n)
+    tld   = _pick(rng, TLDS, n, TLD_WEIGHTS)
+    dates = pa.array(START_DATE + rng.integers(0, DAYS, n)).cast(pa.date32()).cast(pa.string())
+
+    table = pa.table({
+        "Index": pa.array(np.arange(start_index, start_index + n)),
+        "Customer Id": _join(*[_pick(rng, list("0123456789ABCDEF"), n) for _ in range(15)]),
+        "First Name": first,
+        "Last Name": last,
+        "Company": _pick(rng, COMPANIES, n),
+        "City": _pick(rng, CITIES, n),
+        "Country": _pick(rng, COUNTRIES, n, COUNTRY_WEIGHTS),
+        "Phone 1": _phones(rng, n),
+        "Phone 2": _phones(rng, n),
+        "Email": _join(pc.utf8_lower(first), ".", pc.utf8_lower(last), _digits(rng, n, 4), "@example.", tld),
+        "Subscription Date": dates,
+        "Website": _join(_pick(rng, ["http://", "https://"], n), _pick(rng, ["www.", ""], n, [0.7, 0.3]),
+                         pc.utf8_lower(last), _digits(rng, n, 4), ".", tld, "/"),
+    })
+    return table.to_pandas()
+
+
+def write_customers_csv(path: str, n: int, seed: int = 0, chunk_rows: int = 500_000):
+    """
+    Writes n synthetic customers to path in chunks, so any size fits in memory
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    for i, start in enumerate(range(0, n, chunk_rows)):
+        chunk = make_customers(min(chunk_rows, n - start), seed=seed + i, start_index=start + 1)
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic customers CSV in the layout of the test data")
+    parser.add_argument("path", nargs="?", default="data/customers-2000000.csv")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_customers_csv(args.path, args.rows, args.seed)
+    print(f"wrote {args.rows:,} customers to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import duckdb as db
+import pandas as pd
+
+from enrichment import CC_PATTERN, HOST_PATTERN, HOST_PATTERN_FULL, MID_TLDS, PREMIUM_TLDS, STRIP_PATTERN
+
+# The enrichment of enrichment.py as DuckDB macros, same RE2 patterns so both give the same columns.
+# Each pattern has a single capturing group, regexp_extract takes it by position.
+
+# What str.isspace / utf8_ltrim_whitespace strip. ltrim(url, characters) is several times slower than a regex.
+WHITESPACE_CLASS = "[" + "".join(chr(c) for c in range(0x3001) if chr(c).isspace()) + "]"
+CONTROL_CLASS    = r"[\t\r\n]"
+
+
+def _sql(value) -> str:
+    if isinstance(value, (tuple, list)):
+        return "(" + ", ".join(_sql(v) for v in value) + ")"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+MACROS_SQL = f"""
+    CREATE OR REPLACE MACRO phone_cc(raw) AS
+        regexp_extract(trim(coalesce(CAST(raw AS VARCHAR), '')), {_sql(CC_PATTERN)}, 1);
+
+    CREATE OR REPLACE MACRO phone_std(raw) AS
+        regexp_replace(trim(coalesce(CAST(raw AS VARCHAR), '')), {_sql(STRIP_PATTERN)}, '', 'g');
+
+    -- urlparse drops tabs/newlines anywhere and leading whitespace before parsing, only the rare
+    -- rows that have any go through the replacements
+    CREATE OR REPLACE MACRO website_clean(url) AS
+        CASE WHEN regexp_matches(coalesce(CAST(url AS VARCHAR), ''), {_sql(CONTROL_CLASS + "|^" + WHITESPACE_CLASS)})
+             THEN regexp_replace(regexp_replace(CAST(url AS VARCHAR), {_sql(CONTROL_CLASS)}, '', 'g'), {_sql("^" + WHITESPACE_CLASS + "+")}, '')
+             ELSE coalesce(CAST(url AS VARCHAR), '')
+        END;
+
+    -- Host of a cleaned URL. The userinfo/IPv6 pattern only on rows containing @ or [, it is several times slower.
+    CREATE OR REPLACE MACRO website_host(url) AS lower(
+        CASE WHEN contains(url, '@') OR contains(url, '[')
+             THEN regexp_replace(regexp_extract(url, {_sql(HOST_PATTERN_FULL)}, 1), '^\\[|\\]$', '', 'g')
+             ELSE regexp_extract(url, {_sql(HOST_PATTERN)}, 1)
+        END);
+
+    CREATE OR REPLACE MACRO website_tld(host) AS split_part(host, '.', -1);
+
+    CREATE OR REPLACE MACRO buying_power(tld) AS
+        CASE WHEN tld IN {_sql(PREMIUM_TLDS)} THEN 'premium'
+             WHEN tld IN {_sql(MID_TLDS)} THEN 'mid'
+             WHEN tld <> '' THEN 'budget'
+             ELSE 'unknown'
+        END;
+"""
+
+# The columns enrich_customers adds, the pipeline.py Parquet dataset already holds them
+ENRICHED_COLUMNS = ("Phone 1 CC", "Phone 1 Standard", "Phone 2 CC", "Phone 2 Standard",
+                    "Website Domain", "Website TLD", "Website Buying Power")
+
+# customers is the raw source, customers_enriched adds the notebook's columns on top of it. Both are
+# views, every query scans the CSV/Parquet again instead of holding a copy in memory.
+ENRICHED_VIEW_SQL = """
+    CREATE OR REPLACE VIEW customers_enriched AS
+    WITH hosts AS (
+        SELECT *, website_host(website_clean("Website")) AS "Website Domain"
+        FROM customers
+    )
+    SELECT * EXCLUDE ("Website Domain") REPLACE (TRY_CAST("Subscription Date" AS DATE) AS "Subscription Date"),
+           phone_cc("Phone 1")  AS "Phone 1 CC",
+           phone_std("Phone 1") AS "Phone 1 Standard",
+           phone_cc("Phone 2")  AS "Phone 2 CC",
+           phone_std("Phone 2") AS "Phone 2 Standard",
+           "Website Domain",
+           website_tld("Website Domain") AS "Website TLD",
+           buying_power(website_tld("Website Domain")) AS "Website Buying Power"
+    FROM hosts
+"""
+
+# A source that is already enriched is passed through, only the date is cast like above
+PRE_ENRICHED_VIEW_SQL = """
+    CREATE OR REPLACE VIEW customers_enriched AS
+    SELECT * REPLACE (TRY_CAST("Subscription Date" AS DATE) AS "Subscription Date")
+    FROM customers
+"""
+
+# The notebook insights, each a GROUP BY that returns a handful of rows
+INSIGHTS_SQL = """
+    CREATE OR REPLACE VIEW monthly_signups AS
+    SELECT date_trunc('month', "Subscription Date") AS month, COUNT(*) AS signups
+    FROM customers_enriched
+    WHERE "Subscription Date" IS NOT NULL
+    GROUP BY month
+    ORDER BY month;
+
+    CREATE OR REPLACE VIEW country_counts AS
+    SELECT "Country", COUNT(*) AS customers
+    FROM customers
+    WHERE "Country" IS NOT NULL
+    GROUP BY "Country"
+    ORDER BY customers DESC, "Country";
+
+    CREATE OR REPLACE VIEW buying_power_by_year AS
+    SELECT year("Subscription Date") AS year, "Website Buying Power" AS bucket, COUNT(*) AS customers
+    FROM customers_enriched
+    WHERE "Subscription Date" IS NOT NULL
+    GROUP BY ALL
+    ORDER BY year, bucket;
+
+    -- All three in one scan of the source, grouping_id tells the sets apart (0 month, 1 country, 2 year/bucket)
+    CREATE OR REPLACE VIEW customer_insights AS
+    SELECT CASE GROUPING(month, "Country", year, bucket) WHEN 7 THEN 0 WHEN 11 THEN 1 ELSE 2 END AS grouping_id,
+           month, "Country", year, bucket, COUNT(*) AS customers
+    FROM (
+        SELECT date_trunc('month', "Subscription Date") AS month, "Country",
+               year("Subscription Date") AS year, "Website Buying Power" AS bucket
+        FROM customers_enriched
+    )
+    GROUP BY GROUPING SETS ((month), ("Country"), (year, bucket));
+"""
+
+
+def source_sql(path: str) -> str:
+    """
+    read_parquet for .parquet paths/globs (the pipeline.py dataset), read_csv_auto otherwise.
+    Phone columns are read as text, an all-digit column would otherwise come back as BIGINT.
+    """
+    if path.endswith(".parquet") or path.endswith("/"):
+        glob = path if path.endswith(".parquet") else path + "**/*.parquet"
+        return f"read_parquet({_sql(glob)}, hive_partitioning = true)"
+    return f"read_csv_auto({_sql(path)}, types = {{'Phone 1': 'VARCHAR', 'Phone 2': 'VARCHAR'}})"
+
+
+def create_views(source: str, con: db.DuckDBPyConnection | None = None) -> db.DuckDBPyConnection:
+    """
+    Registers the enrichment macros and the customers / customers_enriched / insight views over
+    a CSV or Parquet source, on con or a new in-memory connection. A source that already has the
+    enriched columns (the pipeline.py dataset) is not enriched again.
+    """
+    con = con or db.connect()
+    con.execute(MACROS_SQL)
+    con.execute(f"CREATE OR REPLACE VIEW customers AS SELECT * FROM {source_sql(source)}")
+    columns = {name for name, *_ in con.execute("DESCRIBE customers").fetchall()}
+    con.execute(PRE_ENRICHED_VIEW_SQL if columns.issuperset(ENRICHED_COLUMNS) else ENRICHED_VIEW_SQL)
+    con.execute(INSIGHTS_SQL)
+    return con
+
+
+def _monthly(df: pd.DataFrame) -> pd.Series:
+    df = df.sort_values("month")
+    return pd.Series(df["signups"].to_numpy(), index=pd.PeriodIndex(df["month"], freq="M", name="Subscription Date"))
+
+
+def _countries(df: pd.DataFrame) -> pd.Series:
+    df = df.sort_values(["customers", "Country"], ascending=[False, True])
+    return df.set_index("Country")["customers"].rename("count")
+
+
+def _mix(df: pd.DataFrame) -> pd.DataFrame:
+    mix = df.pivot(index="year", columns="bucket", values="customers").fillna(0).astype("int64").sort_index()
+    return mix.rename_axis(index="Subscription Date", columns="Website Buying Power")
+
+
+def monthly_signups(con: db.DuckDBPyConnection) -> pd.Series:
+    """
+    Signups per month, as main_df.groupby(dt.to_period('M')).size()
+    """
+    return _monthly(con.execute("SELECT * FROM monthly_signups").df())
+
+
+def country_counts(con: db.DuckDBPyConnection) -> pd.Series:
+    """
+    Customers per country, as main_df['Country'].value_counts()
+    """
+    return _countries(con.execute("SELECT * FROM country_counts").df())
+
+
+def buying_power_by_year(con: db.DuckDBPyConnection) -> pd.DataFrame:
+    """
+    Customers per signup year and website buying power, as pd.crosstab
+    """
+    return _mix(con.execute("SELECT * FROM buying_power_by_year").df())
+
+
+def insights(con: db.DuckDBPyConnection) -> tuple[pd.Series, pd.Series, pd.DataFrame]:
+    """
+    (monthly_signups, country_counts, buying_power_by_year) from a single scan of the source
+    """
+    df = con.execute("SELECT * FROM customer_insights").df()
+    sets = {i: df[df["grouping_id"] == i] for i in range(3)}
+    monthly   = sets[0].dropna(subset=["month"]).rename(columns={"customers": "signups"})
+    countries = sets[1].dropna(subset=["Country"])
+    mix       = sets[2].dropna(subset=["year"]).astype({"year": "int64"})
+    return _monthly(monthly), _countries(countries), _mix(mix)
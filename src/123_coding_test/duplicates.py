@@ -0,0 +1,248 @@
+import duckdb as db
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# The duplicate checks of both notebooks, label -> columns. Multi-column keys are the stripped values
+# joined by a space, as 1_parse_small built them.
+DUPLICATE_KEYS = {
+    "Company": ("Company",),
+    "Company + City": ("Company", "City"),
+    "Email": ("Email",),
+    "Phone 1": ("Phone 1",),
+    "First + Last": ("First Name", "Last Name"),
+}
+
+HLL_PRECISION = 14        # 16384 registers, ~0.8% standard error on distinct counts
+CMS_WIDTH     = 1 << 20   # counts overestimated by at most e / width * rows with probability 1 - e^-depth
+CMS_DEPTH     = 4
+BATCH_ROWS    = 200_000
+
+SUMMARY_COLUMNS = ["rows", "distinct", "excess_rows", "duplicate_groups", "rows_involved"]
+
+
+def key_sql(columns) -> str:
+    """
+    SQL expression of a key, the column as text, or the stripped columns joined by a space
+    (NULL if any of them is NULL, like pandas string concatenation)
+    """
+    if len(columns) == 1:
+        return f'CAST("{columns[0]}" AS VARCHAR)'
+    return " || ' ' || ".join(f'trim(CAST("{c}" AS VARCHAR))' for c in columns)
+
+
+def _relation(data, con: db.DuckDBPyConnection | None):
+    """
+    (connection, relation name) for a table/view name on con or a pandas/Arrow frame
+    """
+    if isinstance(data, str):
+        return con or db.connect(), f'"{data}"'
+    con = con or db.connect()
+    con.register("_profiled", data)
+    return con, "_profiled"
+
+
+def _keyed_sql(relation: str, keys: dict) -> str:
+    return "SELECT " + ", ".join(f"{key_sql(cols)} AS k{i}" for i, cols in enumerate(keys.values())) + f" FROM {relation}"
+
+
+def profile_duplicates(data, keys: dict = DUPLICATE_KEYS, top_n: int = 5,
+                       con: db.DuckDBPyConnection | None = None,
+                       approximate: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Duplicate profile of every key in keys (label -> columns) from one scan of data, a table/view
+    name on con or a pandas/Arrow frame.
+
+    Returns (summary, top): summary has one row per label with rows (non-null keys), distinct,
+    excess_rows (rows - distinct), duplicate_groups and rows_involved (groups seen more than once,
+    NULL keys are never a group, as value_counts drops them); top has the top_n most repeated keys
+    per label. approximate=True streams the keys through HyperLogLog and count-min sketches instead of
+    hashing every key exactly; distinct, excess_rows and top counts become estimates and
+    duplicate_groups / rows_involved are left empty.
+    """
+    con, relation = _relation(data, con)
+    try:
+        if approximate:
+            return _profile_approximate(con, relation, keys, top_n)
+        return _profile_exact(con, relation, keys, top_n)
+    finally:
+        if not isinstance(data, str):
+            con.unregister("_profiled")
+
+
+def _profile_exact(con, relation: str, keys: dict, top_n: int):
+    # One GROUP BY GROUPING SETS ((k0), (k1), ...) builds the groups of every key in a single scan,
+    # GROUPING() tells them apart: only key i grouped -> every bit but bit n-1-i set
+    n    = len(keys)
+    ks   = [f"k{i}" for i in range(n)]
+    full = (1 << n) - 1
+    gid  = {full ^ (1 << (n - 1 - i)): label for i, label in enumerate(keys)}
+    df = con.execute(f"""
+        WITH keyed AS ({_keyed_sql(relation, keys)}),
+        groups AS (
+            SELECT GROUPING({", ".join(ks)}) AS gid, COALESCE({", ".join(ks)}) AS key, COUNT(*) AS cnt
+            FROM keyed
+            GROUP BY GROUPING SETS ({", ".join(f"({k})" for k in ks)})
+        )
+        SELECT gid,
+               SUM(cnt) FILTER (WHERE key IS NOT NULL)             AS rows,
+               COUNT(*) FILTER (WHERE key IS NOT NULL)             AS "distinct",
+               COUNT(*) FILTER (WHERE cnt > 1 AND key IS NOT NULL)              AS duplicate_groups,
+               COALESCE(SUM(cnt) FILTER (WHERE cnt > 1 AND key IS NOT NULL), 0) AS rows_involved,
+               max_by({{'key': key, 'count': cnt}}, cnt, {int(top_n)}) FILTER (WHERE cnt > 1 AND key IS NOT NULL) AS top
+        FROM groups
+        GROUP BY gid
+    """).df()
+
+    df["label"] = df["gid"].map(gid)
+    df["rows"]  = df["rows"].fillna(0).astype("int64")
+    df["rows_involved"] = df["rows_involved"].astype("int64")
+    df["excess_rows"] = df["rows"] - df["distinct"]
+    top = [dict(label=label, rank=rank, **entry)
+           for label, entries in zip(df["label"], df["top"]) if isinstance(entries, (list, np.ndarray))
+           for rank, entry in enumerate(entries, start=1)]
+    return _summary(df, keys), _top(top, keys)
+
+
+def _summary(df: pd.DataFrame, keys: dict) -> pd.DataFrame:
+    return df.set_index("label").reindex(list(keys))[SUMMARY_COLUMNS]
+
+
+def _top(rows: list, keys: dict) -> pd.DataFrame:
+    top = pd.DataFrame(rows, columns=["label", "rank", "key", "count"])
+    order = {label: i for i, label in enumerate(keys)}
+    return top.sort_values(["label", "rank"], key=lambda s: s.map(order) if s.name == "label" else s, ignore_index=True)
+
+
+class HyperLogLog:
+    """
+    Distinct count estimate from 64-bit hashes, 2^precision one-byte registers
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray):
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        # Rank of the first set bit in the next 32 bits, frexp's exponent is exact below 2**53
+        rest  = ((hashes << np.uint64(self.p)) >> np.uint64(32)).astype(np.float64)
+        rank  = (33 - np.frexp(rest)[1]).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self) -> float:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw   = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            return self.m * np.log(self.m / zeros)   # linear counting while most registers are empty
+        return float(raw)
+
+
+class CountMinSketch:
+    """
+    Frequency estimates from 64-bit hashes, never below the true count
+    """
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH):
+        self.width  = width
+        self.depth  = depth
+        self.counts = np.zeros((depth, width), dtype=np.uint32)
+
+    def _columns(self, hashes: np.ndarray):
+        # Double hashing, row i uses h1 + i * h2
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        return [((h1 + np.uint64(i) * h2) % np.uint64(self.width)).astype(np.intp) for i in range(self.depth)]
+
+    def add(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Counts the hashes in with conservative update (a cell only grows as far as the smallest
+        estimate of the keys hitting it needs), returns their estimates including this batch
+        """
+        codes, unique = pd.factorize(hashes)
+        columns = self._columns(unique)
+        target  = np.min([row[cols] for row, cols in zip(self.counts, columns)], axis=0) + \
+                  np.bincount(codes, minlength=len(unique)).astype(np.uint32)
+        for row, cols in zip(self.counts, columns):
+            np.maximum.at(row, cols, target)
+        return target[codes]
+
+    def query(self, hashes: np.ndarray) -> np.ndarray:
+        return np.min([row[cols] for row, cols in zip(self.counts, self._columns(hashes))], axis=0)
+
+
+class TopK:
+    """
+    Heavy hitter candidates for a count-min sketch: the keys with the highest estimates seen so
+    far, capped at capacity
+    """
+
+    def __init__(self, cms: CountMinSketch, capacity: int):
+        self.cms        = cms
+        self.capacity   = capacity
+        self.candidates = {}   # hash -> key
+        self.floor      = 1    # estimate a key has to beat, the lowest kept one once at capacity
+
+    def offer(self, hashes: np.ndarray, estimates: np.ndarray, keys: pa.Array):
+        rows = np.flatnonzero(estimates > self.floor)
+        if not len(rows):
+            return
+        # First row of every distinct hash above the floor, factorize hashes instead of sorting
+        codes, unique = pd.factorize(hashes[rows])
+        first = np.empty(len(unique), dtype=np.intp)
+        first[codes[::-1]] = rows[::-1]
+        best = np.argsort(estimates[first])[::-1][: self.capacity]
+        new  = [i for i in best.tolist() if int(unique[i]) not in self.candidates]
+        for i, key in zip(new, keys.take(pa.array(first[new], type=pa.int64())).to_pylist()):
+            self.candidates[int(unique[i])] = key
+        if len(self.candidates) > 2 * self.capacity:
+            self.prune()
+
+    def prune(self):
+        self.candidates = dict(self._ranked()[: self.capacity])
+        self.floor = max(self.floor, int(self._estimates[self.capacity - 1]))
+
+    def _ranked(self) -> list:
+        # Estimates only ever grow, so re-querying ranks the candidates by their current counts
+        hashes = np.fromiter(self.candidates, dtype=np.uint64, count=len(self.candidates))
+        estimates = self.cms.query(hashes)
+        order = np.argsort(estimates, kind="stable")[::-1]
+        self._estimates = estimates[order]
+        return [(int(hashes[i]), self.candidates[int(hashes[i])]) for i in order]
+
+    def top(self, n: int) -> list:
+        if not self.candidates:
+            return []
+        ranked = self._ranked()[:n]
+        return [{"key": key, "count": int(count)} for (_, key), count in zip(ranked, self._estimates)]
+
+
+def _profile_approximate(con, relation: str, keys: dict, top_n: int, batch_rows: int = BATCH_ROWS):
+    # Hashes come from DuckDB's hash(), the keys themselves are only looked up for top-k candidates
+    columns = ", ".join(f"k{i}, hash(k{i}) AS h{i}" for i in range(len(keys)))
+    reader  = con.execute(f"SELECT {columns} FROM ({_keyed_sql(relation, keys)})").to_arrow_reader(batch_rows)
+
+    labels = list(keys)
+    hlls   = [HyperLogLog() for _ in labels]
+    sketch = [CountMinSketch() for _ in labels]
+    topk   = [TopK(cms, max(10 * top_n, 100)) for cms in sketch]
+    rows   = [0] * len(labels)
+    for batch in reader:
+        for i in range(len(labels)):
+            valid  = pc.is_valid(batch[f"k{i}"])
+            keys_i = batch[f"k{i}"].filter(valid)
+            hashes = batch[f"h{i}"].filter(valid).to_numpy()
+            rows[i] += len(hashes)
+            hlls[i].add(hashes)
+            topk[i].offer(hashes, sketch[i].add(hashes), keys_i)
+
+    summary, top = [], []
+    for i, label in enumerate(labels):
+        distinct = min(round(hlls[i].estimate()), rows[i])
+        summary.append({"label": label, "rows": rows[i], "distinct": distinct, "excess_rows": rows[i] - distinct,
+                        "duplicate_groups": np.nan, "rows_involved": np.nan})
+        top += [dict(label=label, rank=rank, **entry) for rank, entry in enumerate(topk[i].top(top_n), start=1)]
+    return _summary(pd.DataFrame(summary), keys), _top(top, keys)
@@ -0,0 +1,171 @@
+import argparse
+import os
+import resource
+import shutil
+import time
+from collections import Counter
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.parquet as pq
+
+from enrichment import DATE_COLUMN, PHONE_COLUMNS, WEBSITE_COLUMN, enrich_customers
+
+# The CSV reader reads 32 blocks ahead of the consumer, so the block size bounds memory, ~32 MB here.
+# Blocks are merged into BATCH_ROWS batches before the enrichment, per-batch overhead stays small.
+BLOCK_SIZE = 1 << 20    # bytes, ~6k customer rows
+BATCH_ROWS = 100_000
+# Text columns are read as strings whatever the first block looks like, so every batch has the same
+# schema (a block of digit-only phone numbers would otherwise be inferred as int64)
+STRING_COLUMNS = ("Customer Id", "First Name", "Last Name", "Company", "City", "Country",
+                  *PHONE_COLUMNS, "Email", DATE_COLUMN, WEBSITE_COLUMN)
+PARTITION_COLUMN = "Signup Year"
+# Dictionary encoding only pays off on the repetitive columns, ids/emails/phones are near unique
+DICTIONARY_COLUMNS = ["First Name", "Last Name", "Company", "City", "Country", "Website TLD", "Website Buying Power",
+                      *(f"{c} CC" for c in PHONE_COLUMNS)]
+
+
+class RunningAggregates:
+    """
+    The notebook insights, updated batch by batch. Memory grows with the number of distinct
+    months / countries / years, not with the number of rows.
+    """
+
+    def __init__(self):
+        self.rows      = 0
+        self.monthly   = Counter()   # first day of the month -> signups
+        self.countries = Counter()   # country -> customers
+        self.buying    = Counter()   # (year, bucket) -> customers
+
+    def update(self, batch: pa.RecordBatch, years=None):
+        self.rows += batch.num_rows
+        dates  = batch[DATE_COLUMN]
+        table  = pa.table({
+            "month": pc.floor_temporal(dates, unit="month"),
+            "year": pc.year(dates) if years is None else years,
+            "country": batch["Country"],
+            "bucket": batch["Website Buying Power"],
+        })
+        # Null keys are dropped, like pandas groupby / value_counts / crosstab do
+        for keys, counter in ((["month"], self.monthly), (["country"], self.countries), (["year", "bucket"], self.buying)):
+            counts = table.group_by(keys).aggregate([([], "count_all")]).to_pydict()
+            for *key, n in zip(*(counts[k] for k in keys), counts["count_all"]):
+                if None not in key:
+                    counter[key[0] if len(key) == 1 else tuple(key)] += n
+
+    def monthly_signups(self) -> pd.Series:
+        """
+        Signups per month, as main_df.groupby(dt.to_period('M')).size()
+        """
+        monthly = pd.Series(self.monthly, dtype="int64").sort_index()
+        monthly.index = pd.DatetimeIndex(monthly.index).to_period("M").rename(DATE_COLUMN)
+        return monthly
+
+    def country_counts(self) -> pd.Series:
+        """
+        Customers per country, as main_df['Country'].value_counts()
+        """
+        return pd.Series(self.countries, dtype="int64", name="count").rename_axis("Country").sort_values(ascending=False)
+
+    def buying_power_by_year(self) -> pd.DataFrame:
+        """
+        Customers per signup year and website buying power, as pd.crosstab
+        """
+        mix = pd.Series(self.buying, dtype="int64").unstack(fill_value=0).sort_index()
+        return mix.rename_axis(index=DATE_COLUMN, columns="Website Buying Power")
+
+
+def peak_rss_mb() -> float:
+    # VmHWM where there is /proc, ru_maxrss carries over the parent's peak across exec
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024
+    except (OSError, StopIteration):
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1 << 20) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def read_batches(path: str, block_size: int = BLOCK_SIZE, batch_rows: int = BATCH_ROWS):
+    """
+    Record batches of about batch_rows rows of the CSV, read block_size bytes at a time
+    """
+    reader = csv.open_csv(
+        path,
+        read_options=csv.ReadOptions(block_size=block_size),
+        convert_options=csv.ConvertOptions(column_types={c: pa.string() for c in STRING_COLUMNS}),
+    )
+    pending, rows = [], 0
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= batch_rows:
+            yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+            pending, rows = [], 0
+    if rows:
+        yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+
+
+def enrich_csv_to_parquet(path: str, out_dir: str, block_size: int = BLOCK_SIZE, batch_rows: int = BATCH_ROWS,
+                          overwrite: bool = False, verbose: bool = False) -> RunningAggregates:
+    """
+    Streams path through enrich_customers into a Parquet dataset partitioned by signup year
+    (out_dir/Signup Year=2021/part-0.parquet, ...) and returns the running aggregates. Only one
+    record batch is held in memory at a time.
+    """
+    if os.path.isdir(out_dir) and os.listdir(out_dir):
+        if not overwrite:
+            raise FileExistsError(f"{out_dir} is not empty, pass overwrite=True to replace it")
+        shutil.rmtree(out_dir)
+
+    aggs, writers = RunningAggregates(), {}
+    start = time.perf_counter()
+    try:
+        for batch in read_batches(path, block_size, batch_rows):
+            batch = enrich_customers(batch)
+            years = pc.year(batch[DATE_COLUMN])
+            aggs.update(batch, years)
+
+            for year in pc.unique(years).to_pylist():
+                part = batch.filter(pc.is_null(years) if year is None else pc.equal(years, year))
+                if year not in writers:
+                    part_dir = os.path.join(out_dir, f"{PARTITION_COLUMN}={'__HIVE_DEFAULT_PARTITION__' if year is None else year}")
+                    os.makedirs(part_dir, exist_ok=True)
+                    writers[year] = pq.ParquetWriter(os.path.join(part_dir, "part-0.parquet"), batch.schema,
+                                                     use_dictionary=[c for c in DICTIONARY_COLUMNS if c in batch.schema.names])
+                writers[year].write_batch(part)
+
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print(f"{aggs.rows:>12,} rows  {aggs.rows / elapsed:>10,.0f} rows/s  peak RSS {peak_rss_mb():,.0f} MB")
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return aggs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich a customers CSV into partitioned Parquet in constant memory")
+    parser.add_argument("path", nargs="?", default="data/customers-2000000.csv")
+    parser.add_argument("out_dir", nargs="?", default="data/customers_enriched")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--overwrite", action="store_true")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    aggs = enrich_csv_to_parquet(args.path, args.out_dir, args.block_size, args.batch_rows, args.overwrite, verbose=not args.quiet)
+    elapsed = time.perf_counter() - start
+
+    if not args.quiet:
+        print(f"\nMonthly signups:\n{aggs.monthly_signups().tail(6)}")
+        print(f"\nTop countries:\n{aggs.country_counts().head(5)}")
+        print(f"\nBuying power by year:\n{aggs.buying_power_by_year()}\n")
+    print(f"rows={aggs.rows} seconds={elapsed:.2f} rows_per_sec={aggs.rows / elapsed:.0f} peak_rss_mb={peak_rss_mb():.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import argparse, os, sqlite3, time
+import numpy as np
+
+from populatevector import changed_rows, init_db
+from search import DB_FILE, VectorIndex, top_k_from_scores
+
+NPROBE         = 8
+KMEANS_ITERS   = 20
+TRAIN_PER_LIST = 256   # k-means is trained on at most nlist * TRAIN_PER_LIST sampled vectors
+
+
+def index_path(db_file: str = DB_FILE) -> str:
+    """
+    The IVF index is persisted next to the database, localvector.db -> localvector.ivf.npz
+    """
+    return os.path.splitext(db_file)[0] + ".ivf.npz"
+
+
+def default_nlist(n: int) -> int:
+    return max(1, min(n, int(4 * np.sqrt(n))))
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-9)).astype("float32")
+
+
+def spherical_kmeans(x, nlist: int, iters: int = KMEANS_ITERS, seed: int = 0):
+    """
+    k-means on unit vectors (cosine distance), returns unit centroids of shape (nlist, dim)
+    """
+    rng = np.random.default_rng(seed)
+    if len(x) > nlist * TRAIN_PER_LIST:
+        x = x[rng.choice(len(x), nlist * TRAIN_PER_LIST, replace=False)]
+
+    centroids = x[rng.choice(len(x), nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums   = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=nlist)
+
+        # Empty lists get re-seeded from random points instead of staying dead
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index: vectors are bucketed under their nearest k-means centroid and a
+    query only scores the vectors of its nprobe closest buckets. nprobe is the recall/latency knob,
+    nprobe = nlist is exact brute force.
+    """
+
+    def __init__(self, centroids, ids, matrix, assign, last_rowid: int = 0, last_version: int = 0):
+        self.centroids    = centroids
+        self.ids          = list(ids)
+        self.matrix       = matrix
+        self.assign       = assign
+        self.last_rowid   = last_rowid
+        self.last_version = last_version
+        self._build_lists()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def _build_lists(self):
+        order  = np.argsort(self.assign, kind="stable")
+        bounds = np.searchsorted(self.assign[order], np.arange(self.nlist + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(self.nlist)]
+
+    @classmethod
+    def build(cls, ids, vectors, nlist: int | None = None, last_rowid: int = 0, last_version: int = 0, seed: int = 0):
+        matrix    = normalize_rows(np.asarray(vectors, dtype="float32"))
+        nlist     = min(nlist or default_nlist(len(matrix)), len(matrix))
+        centroids = spherical_kmeans(matrix, nlist, seed=seed)
+        assign    = np.argmax(matrix @ centroids.T, axis=1)
+        return cls(centroids, ids, matrix, assign, last_rowid, last_version)
+
+    @classmethod
+    def build_from_sqlite(cls, db_file: str = DB_FILE, nlist: int | None = None):
+        con = sqlite3.connect(db_file)
+        try:
+            init_db(con)
+            rows = changed_rows(con, 0, 0)
+        finally:
+            con.close()
+        if not rows:
+            raise ValueError(f"No vectors in {db_file} to build an index from")
+        flat = VectorIndex.from_rows([row[1:5] for row in rows])
+        return cls.build(flat.ids, flat.matrix, nlist, last_rowid=rows[-1][0], last_version=max(row[5] for row in rows))
+
+    def add(self, ids, vectors):
+        """
+        Assigns new vectors to their nearest existing centroid, the centroids are not retrained
+        """
+        vectors = normalize_rows(np.asarray(vectors, dtype="float32"))
+        if not len(vectors):
+            return
+        self.ids.extend(ids)
+        self.matrix = np.vstack([self.matrix, vectors])
+        self.assign = np.concatenate([self.assign, np.argmax(vectors @ self.centroids.T, axis=1)])
+        self._build_lists()
+
+    def replace(self, positions, vectors):
+        """
+        Swaps in new vectors for rows already in the index and re-assigns them to their nearest centroid
+        """
+        vectors = normalize_rows(np.asarray(vectors, dtype="float32"))
+        if not len(vectors):
+            return
+        self.matrix = self.matrix.copy()
+        self.matrix[positions] = vectors
+        self.assign = self.assign.copy()
+        self.assign[positions] = np.argmax(vectors @ self.centroids.T, axis=1)
+        self._build_lists()
+
+    def sync(self, db_file: str = DB_FILE):
+        """
+        Pulls rows inserted (by rowid) or rewritten (by version) since the last build/sync into
+        the index, returns how many
+        """
+        con = sqlite3.connect(db_file)
+        try:
+            init_db(con)
+            rows = changed_rows(con, self.last_rowid, self.last_version)
+        finally:
+            con.close()
+        if rows:
+            flat      = VectorIndex.from_rows([row[1:5] for row in rows])
+            positions = {vid: i for i, vid in enumerate(self.ids)}
+            updated   = [i for i, vid in enumerate(flat.ids) if vid in positions]
+            added     = [i for i, vid in enumerate(flat.ids) if vid not in positions]
+            self.replace([positions[flat.ids[i]] for i in updated], flat.matrix[updated])
+            self.add([flat.ids[i] for i in added], flat.matrix[added])
+            self.last_rowid   = max(self.last_rowid, rows[-1][0])
+            self.last_version = max(self.last_version, max(row[5] for row in rows))
+        return len(rows)
+
+    def search(self, query_vec, top_k: int = 5, nprobe: int = NPROBE):
+        """
+        Returns [(cosine, id), ...] for the approximate top_k, best first
+        """
+        q = np.asarray(query_vec, dtype="float32")
+        q = q / (np.linalg.norm(q) + 1e-9)
+
+        nprobe = min(nprobe, self.nlist)
+        probes = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        cand   = np.concatenate([self.lists[c] for c in probes])
+        if not len(cand):
+            return []
+
+        scores = self.matrix[cand] @ q
+        return [(s, self.ids[cand[i]]) for s, i in top_k_from_scores(scores, range(len(cand)), top_k)]
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, ids=np.asarray(self.ids), matrix=self.matrix,
+                 assign=self.assign, last_rowid=self.last_rowid, last_version=self.last_version)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as f:
+            # Indexes saved before versions were tracked start from version 0
+            last_version = int(f["last_version"]) if "last_version" in f else 0
+            return cls(f["centroids"], f["ids"].tolist(), f["matrix"], f["assign"], int(f["last_rowid"]), last_version)
+
+
+def recall_report(ids, vectors, queries, top_k: int = 10, nlist: int | None = None, nprobes=(1, 2, 4, 8, 16, 32)):
+    """
+    recall@k and mean query latency of the IVF index against brute force, one row per nprobe
+    """
+    exact = VectorIndex(ids, np.asarray(vectors, dtype="float32"), np.linalg.norm(vectors, axis=1))
+    index = IVFIndex.build(ids, vectors, nlist)
+
+    truth = [{vid for _, vid in exact.search(q, top_k)} for q in queries]
+    start = time.perf_counter()
+    for q in queries:
+        exact.search(q, top_k)
+    brute_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    report = []
+    for nprobe in nprobes:
+        if nprobe > index.nlist:
+            break
+        start = time.perf_counter()
+        found = [{vid for _, vid in index.search(q, top_k, nprobe)} for q in queries]
+        ms    = (time.perf_counter() - start) / len(queries) * 1000
+        hits  = sum(len(f & t) for f, t in zip(found, truth))
+        report.append({"nprobe": nprobe, "recall": hits / sum(len(t) for t in truth),
+                       "ms_per_query": ms, "brute_ms_per_query": brute_ms})
+    return index.nlist, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF approximate nearest-neighbour index over the vectors table")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build the index from the database and save it next to it")
+    build.add_argument("--db", default=DB_FILE)
+    build.add_argument("--nlist", type=int)
+
+    sync = sub.add_parser("sync", help="add rows inserted and re-embed rows rewritten since the last build/sync")
+    sync.add_argument("--db", default=DB_FILE)
+
+    report = sub.add_parser("report", help="recall@k vs brute force per nprobe")
+    report.add_argument("--db", default=DB_FILE)
+    report.add_argument("--synthetic", type=int, help="use N random clustered vectors instead of the database")
+    report.add_argument("--dim", type=int, default=1536)
+    report.add_argument("--nlist", type=int)
+    report.add_argument("--queries", type=int, default=100)
+    report.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = IVFIndex.build_from_sqlite(args.db, args.nlist)
+        index.save(index_path(args.db))
+        print(f"indexed {len(index)} vectors into {index.nlist} lists -> {index_path(args.db)}")
+
+    elif args.command == "sync":
+        index = IVFIndex.load(index_path(args.db))
+        synced = index.sync(args.db)
+        index.save(index_path(args.db))
+        print(f"synced {synced} new or rewritten vectors, index now holds {len(index)}")
+
+    else:
+        rng = np.random.default_rng(0)
+        if args.synthetic:
+            # Clustered data, uniform random vectors have no neighbourhood structure to exploit
+            centers = rng.standard_normal((max(1, args.synthetic // 1000), args.dim)).astype("float32")
+            vectors = centers[rng.integers(len(centers), size=args.synthetic)]
+            vectors = vectors + 0.5 * rng.standard_normal(vectors.shape).astype("float32")
+            ids     = [str(i) for i in range(args.synthetic)]
+        else:
+            flat = VectorIndex.from_sqlite(args.db)
+            ids, vectors = flat.ids, flat.matrix
+
+        picks   = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+        queries = vectors[picks] + 0.1 * rng.standard_normal((len(picks), vectors.shape[1])).astype("float32")
+
+        nlist, rows = recall_report(ids, vectors, queries, args.top_k, args.nlist)
+        print(f"{len(ids)} vectors, nlist={nlist}, recall@{args.top_k}")
+        print(f"{'nprobe':>6} {'recall':>7} {'ms/query':>9} {'brute ms':>9}")
+        for r in rows:
+            print(f"{r['nprobe']:>6} {r['recall']:>7.3f} {r['ms_per_query']:>9.3f} {r['brute_ms_per_query']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
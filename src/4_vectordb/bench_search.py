@@ -0,0 +1,55 @@
+import argparse, time
+import numpy as np
+
+from search import VectorIndex
+
+# Synthetic vectors only, no database or API key needed
+
+
+def synthetic_index(n: int, dim: int, seed: int = 0) -> VectorIndex:
+    rng    = np.random.default_rng(seed)
+    matrix = rng.standard_normal((n, dim), dtype="float32")
+    return VectorIndex([str(i) for i in range(n)], matrix, np.linalg.norm(matrix, axis=1))
+
+
+def run(index: VectorIndex, queries, batch_size: int, top_k: int):
+    """
+    Returns (queries/sec, p50 ms, p99 ms), latency is per batch call, which is what a caller
+    waiting on that batch sees
+    """
+    latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        t0 = time.perf_counter()
+        if batch_size == 1:
+            index.search(queries[i], top_k)
+        else:
+            index.search_batch(queries[i:i + batch_size], top_k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+    return len(queries) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single vs batched search throughput on synthetic vectors")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng     = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dim), dtype="float32")
+
+    print(f"{args.queries} queries, dim={args.dim}, top_k={args.top_k}")
+    print(f"{'corpus':>8} {'batch':>6} {'queries/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for n in args.sizes:
+        index = synthetic_index(n, args.dim)
+        for batch_size in args.batches:
+            qps, p50, p99 = run(index, queries, batch_size, args.top_k)
+            print(f"{n:>8} {batch_size:>6} {qps:>10.1f} {p50:>9.2f} {p99:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from typing import Callable, Iterable, Iterator
+
+CHUNK_TOKENS   = 400    # target tokens per chunk, well under the 8191 limit of the embedding model
+OVERLAP_TOKENS = 50     # tokens of the previous chunk repeated at the start of the next one
+MIN_TOKENS     = 40     # fragments smaller than this are merged into a neighbour
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("cl100k_base")   # the tokenizer of text-embedding-3-*
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text, disallowed_special=()))
+
+except ImportError:
+    def count_tokens(text: str) -> int:
+        # Roughly 4 characters per token for English text
+        return max(1, len(text) // 4)
+
+
+def read_paragraphs(path: str) -> Iterator[str]:
+    """
+    Lazily yields blank-line separated paragraphs of a text file, one line in memory at a time
+    """
+    lines = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                lines.append(line)
+            elif lines:
+                yield "\n".join(lines)
+                lines = []
+    if lines:
+        yield "\n".join(lines)
+
+
+def split_paragraphs(text: str) -> Iterator[str]:
+    """
+    Same as read_paragraphs, for text already in memory
+    """
+    for block in text.split("\n\n"):
+        block = "\n".join(line.strip() for line in block.splitlines() if line.strip())
+        if block:
+            yield block
+
+
+def _fill(words: list[str], max_tokens: int, count: Callable[[str], int]) -> int:
+    """
+    How many of words fit in max_tokens, at least one so a single oversized word still moves on
+    """
+    lo, hi = 1, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(" ".join(words[:mid])) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _tail(text: str, tokens: int, overlap: int) -> str:
+    if overlap <= 0 or not tokens:
+        return ""
+    words = text.split()
+    keep  = max(1, int(len(words) * min(1.0, overlap / tokens)))
+    return " ".join(words[-keep:])
+
+
+def chunk_paragraphs(paragraphs: Iterable[str], max_tokens: int = CHUNK_TOKENS,
+                     overlap: int = OVERLAP_TOKENS, min_tokens: int = MIN_TOKENS,
+                     count: Callable[[str], int] = count_tokens) -> Iterator[str]:
+    """
+    Packs paragraphs into chunks of up to max_tokens, streaming. Small paragraphs (headers,
+    one-liners) are merged with their neighbours, oversized ones are split on word boundaries,
+    and every chunk after the first starts with the last ~overlap tokens of the previous one
+    (less when a paragraph that fits a chunk on its own would not fit next to the full overlap).
+    """
+    buffer, buffer_tokens = [], 0
+    previous, previous_tokens = "", 0
+    overlap_only = False   # buffer holds nothing but the overlap of the previous chunk
+
+    def emit():
+        nonlocal buffer, buffer_tokens, previous, previous_tokens, overlap_only
+        text = "\n\n".join(buffer)
+        previous, previous_tokens = text, buffer_tokens
+        buffer, buffer_tokens, overlap_only = [], 0, False
+        return text
+
+    def start_buffer(budget: int = overlap):
+        nonlocal buffer, buffer_tokens, overlap_only
+        tail = _tail(previous, previous_tokens, min(overlap, budget))
+        buffer, buffer_tokens, overlap_only = ([tail], count(tail), True) if tail else ([], 0, False)
+
+    for paragraph in paragraphs:
+        tokens = count(paragraph)
+
+        # Only close a chunk once it is big enough, tiny fragments ride along with the next paragraph
+        if buffer and not overlap_only and buffer_tokens + tokens > max_tokens and buffer_tokens >= min_tokens:
+            yield emit()
+            start_buffer()
+
+        # The overlap gives way to a paragraph that fits a chunk by itself, rather than splitting it
+        if overlap_only and buffer_tokens + tokens > max_tokens and tokens <= max_tokens:
+            start_buffer(max_tokens - tokens)
+
+        if buffer_tokens + tokens <= max_tokens:
+            buffer.append(paragraph)
+            buffer_tokens += tokens
+            overlap_only = False
+            continue
+
+        # Too big even for a fresh chunk, split on words with the pending fragment leading. Each
+        # piece is filled up to max_tokens and the next one opens with its overlap, like any chunk.
+        # The last piece stays open so following paragraphs can still fill it up.
+        words = "\n\n".join(buffer + [paragraph]).split()
+        while count(" ".join(words)) > max_tokens:
+            n = _fill(words, max_tokens, count)
+            buffer, buffer_tokens = [" ".join(words[:n])], count(" ".join(words[:n]))
+            yield emit()
+            start_buffer()
+            # An overlap that leaves no room for new words is dropped, so every piece moves forward
+            if buffer and _fill(buffer[0].split() + words[n:], max_tokens, count) <= len(buffer[0].split()):
+                buffer = []
+            words = (buffer[0].split() if buffer else []) + words[n:]
+        buffer, buffer_tokens, overlap_only = [" ".join(words)], count(" ".join(words)), False
+
+    # Whatever is left, unless it is only the overlap of the last chunk
+    if buffer and not overlap_only:
+        yield emit()
+
+
+def chunk_file(path: str, **kwargs) -> Iterator[str]:
+    return chunk_paragraphs(read_paragraphs(path), **kwargs)
+
+
+def chunk_text(text: str, **kwargs) -> Iterator[str]:
+    return chunk_paragraphs(split_paragraphs(text), **kwargs)
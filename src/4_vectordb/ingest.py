@@ -0,0 +1,181 @@
+import argparse, sqlite3, json, os, time, random
+from datetime import date
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Callable
+
+import numpy as np
+import openai
+
+from populatevector import (EMBED_MODEL, init_db, insert_batch, embed_openai_batch, embed_local,
+                            content_hash, lookup_cache, row_id, store_cache)
+from quantize import ENCODINGS, PQCodebook, encode_vectors
+from chunking import CHUNK_TOKENS, OVERLAP_TOKENS, chunk_file
+
+BATCH_SIZE   = 64      # texts per embeddings request
+WORKERS      = 4       # concurrent requests in flight
+COMMIT_EVERY = 1024    # rows per sqlite transaction
+MAX_RETRIES  = 6
+BASE_DELAY   = 1.0     # seconds, doubled on every retry
+
+# Errors worth retrying, everything else bubbles up straight away
+RETRYABLE = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def batched(items: Iterable, n: int):
+    """
+    Lazily groups an iterable into lists of n, the last one may be shorter
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_with_retry(embed_fn: Callable, texts: list[str],
+                     max_retries: int = MAX_RETRIES, base_delay: float = BASE_DELAY):
+    """
+    Calls embed_fn, backing off exponentially (with jitter) on rate limits and transient errors
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return embed_fn(texts)
+        except RETRYABLE:
+            if attempt == max_retries:
+                raise
+            time.sleep(base_delay * (2 ** attempt) * random.uniform(0.5, 1.0))
+
+
+def make_row(vid: str, text: str, vec, data: bytes, encoding: str = "float32", metadata: dict | None = None):
+    """
+    Turns an embedded text into a row for insert_batch. data is vec in the given encoding,
+    l2_norm is always of the full precision vector
+    """
+    meta = {"text": text, **(metadata or {})}
+    return (vid,
+            len(vec),
+            data,
+            float(np.linalg.norm(vec)),
+            json.dumps(meta),
+            encoding)
+
+
+def ingest(con, texts: Iterable[str], embed_fn: Callable = embed_openai_batch, model: str = EMBED_MODEL,
+           batch_size: int = BATCH_SIZE, workers: int = WORKERS, commit_every: int = COMMIT_EVERY,
+           use_cache: bool = True, encoding: str = "float32", codebook: PQCodebook | None = None,
+           metadata: dict | None = None):
+    """
+    Embeds texts in batches on a bounded worker pool and writes them in large transactions.
+
+    texts is consumed lazily, at most workers * 2 batches are in flight at once so memory stays
+    bounded no matter how large the input is. Rows are upserted in input order, keyed by
+    row_id(content_hash(text, model), metadata), one row per chunk and document. With use_cache, chunks found in embedding_cache are never
+    sent to embed_fn, so re-indexing an unchanged corpus makes no API calls. encoding picks the
+    storage format of vectors.data (see quantize.py), the cache always keeps float32. metadata
+    is stored with every row, its source/section/date keys are what search filters on.
+    """
+    cur     = con.cursor()
+    cleaned = (t.strip() for t in texts)
+    batches = batched((t for t in cleaned if t), batch_size)
+
+    pending  = []
+    total    = 0
+    embedded = 0
+    start    = time.perf_counter()
+
+    def drain(future, batch, hashes, vectors, misses):
+        nonlocal total, embedded
+        if future is not None:
+            fresh = [np.asarray(vec, dtype="float32") for vec in future.result()]
+            store_cache(cur, [(h, model, len(vec), vec.tobytes()) for (h, _), vec in zip(misses, fresh)])
+            vectors.update((h, vec) for (h, _), vec in zip(misses, fresh))
+            embedded += len(misses)
+        batch_vecs = [vectors[h] for h in hashes]
+        blobs      = encode_vectors(batch_vecs, encoding, codebook)
+        pending.extend(make_row(row_id(h, metadata), text, vec, blob, encoding, metadata)
+                       for h, text, vec, blob in zip(hashes, batch, batch_vecs, blobs))
+        total += len(batch)
+        if len(pending) >= commit_every:
+            insert_batch(cur, pending)
+            con.commit()
+            pending.clear()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for batch in batches:
+            hashes  = [content_hash(t, model) for t in batch]
+            vectors = lookup_cache(cur, hashes) if use_cache else {}
+            # Unique misses only, a repeated chunk is embedded once
+            misses  = list({h: t for h, t in zip(hashes, batch) if h not in vectors}.items())
+            future  = pool.submit(embed_with_retry, embed_fn, [t for _, t in misses]) if misses else None
+
+            in_flight.append((future, batch, hashes, vectors, misses))
+            if len(in_flight) >= workers * 2:
+                drain(*in_flight.popleft())
+        while in_flight:
+            drain(*in_flight.popleft())
+
+    # Final commit
+    if pending:
+        insert_batch(cur, pending)
+    con.commit()
+
+    elapsed = time.perf_counter() - start
+    return {"chunks": total, "embedded": embedded, "cached": total - embedded,
+            "seconds": elapsed, "chunks_per_sec": total / elapsed if elapsed else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched, concurrent embedding ingestion")
+    parser.add_argument("input", help="text file, read lazily and chunked on paragraph boundaries")
+    parser.add_argument("--db", default="./localvector.db")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_TOKENS, help="target tokens per chunk")
+    parser.add_argument("--overlap", type=int, default=OVERLAP_TOKENS, help="tokens repeated between chunks")
+    parser.add_argument("--local", action="store_true", help="use the offline hash embedder, no API calls")
+    parser.add_argument("--no-cache", action="store_true", help="re-embed every chunk even if cached")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="float32",
+                        help="storage format of the vectors, pq needs: python quantize.py train-pq")
+    parser.add_argument("--source", help="source document stored in metadata, defaults to the input file name")
+    parser.add_argument("--section", help="section stored in metadata")
+    parser.add_argument("--date", default=date.today().isoformat(), help="document date (YYYY-MM-DD) stored in metadata")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated seconds per request for --local, to benchmark concurrency")
+    args = parser.parse_args()
+
+    embed_fn, model = embed_openai_batch, EMBED_MODEL
+    if args.local:
+        model = "local-hash"
+
+        def embed_fn(texts):
+            if args.latency:
+                time.sleep(args.latency)
+            return embed_local(texts)
+
+    texts = chunk_file(args.input, max_tokens=args.max_tokens, overlap=args.overlap)
+
+    metadata = {"source": args.source or os.path.basename(args.input), "date": args.date}
+    if args.section:
+        metadata["section"] = args.section
+
+    con = sqlite3.connect(args.db)
+    init_db(con)
+    try:
+        codebook = PQCodebook.load(con) if args.encoding == "pq" else None
+        stats = ingest(con, texts, embed_fn, model, batch_size=args.batch_size, workers=args.workers,
+                       use_cache=not args.no_cache, encoding=args.encoding, codebook=codebook,
+                       metadata=metadata)
+    finally:
+        con.close()
+
+    print(f"{stats['chunks']} chunks ({stats['embedded']} embedded, {stats['cached']} from cache) "
+          f"in {stats['seconds']:.2f}s ({stats['chunks_per_sec']:.1f} chunks/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,27 @@
-import os, sqlite3, json
-import numpy as np
-from populatevector import embed_openai
+from populatevector import embed_openai_batch
+from search import fetch_metadata
+from store import load_index
 
 DB_FILE   = "./localvector.db"
-QUERY     = "Machine-learning GenAI platform experience at Telkomsel"
+QUERIES   = [
+    "Machine-learning GenAI platform experience at Telkomsel",
+]
 TOP_K     = 5
+FILTERS   = None    # e.g. {"source": "cv.txt", "date__gte": "2024-01-01"}, see search.filter_clause
 
-query_vec = embed_openai(QUERY)
-q_norm    = np.linalg.norm(query_vec)
+# Every query embedded with one API call
+query_vecs = embed_openai_batch(QUERIES)
 
-con   = sqlite3.connect(DB_FILE)
-cur   = con.execute("SELECT id, dim, data, l2_norm, metadata FROM vectors")
+# Memory-mapped store when exported (python store.py), else one matrix read out of SQLite
+index   = load_index(DB_FILE, FILTERS)
+results = index.search_batch(query_vecs, TOP_K)
 
-scores = []
-for vid, dim, blob, v_norm, meta in cur:
-    # I'll have to convert from bytes/buffer first before executing cossim
-    v = np.frombuffer(blob, dtype="float32", count=dim)
-    print(v_norm)
-    print(type(v_norm))
-    cos = float(np.dot(v, query_vec) / (v_norm * q_norm + 1e-9))
-    snippet = json.loads(meta)["text"][:100] if meta else ""
-    scores.append((cos, vid, snippet))
+# Only the winners get their metadata decoded
+metadata = fetch_metadata(list({vid for top in results for _, vid in top}), DB_FILE)
 
-con.close()
-
-top = sorted(scores, key=lambda x: x[0], reverse=True)[:TOP_K]
-
-print(f"Top {TOP_K} matches for: '{QUERY}'\n")
-for rank, (cos, vid, snippet) in enumerate(top, 1):
-    print(f"{rank}. cosine={cos:.4f} content : {snippet}")
\ No newline at end of file
+for query, top in zip(QUERIES, results):
+    print(f"Top {TOP_K} matches for: '{query}'\n")
+    for rank, (cos, vid) in enumerate(top, 1):
+        snippet = metadata.get(vid, {}).get("text", "")[:100]
+        print(f"{rank}. cosine={cos:.4f} content : {snippet}")
+    print()
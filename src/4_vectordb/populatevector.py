@@ -1,4 +1,4 @@
-import argparse, sqlite3, uuid, json, os, sys
+import argparse, sqlite3, threading, uuid, json, os, sys
 import numpy as np
 from hashlib import blake2b
 from typing import Iterable
@@ -7,18 +7,56 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_DIM   = 1536
+
+_client      = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    The OpenAI client is created on first use, so importing this module works offline. The lock
+    makes sure concurrent first calls (the search server's worker threads) share one client.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 def embed_openai(text: str):
     """
     Embeds the texts into a float32 vector with OpenAI's embedding
     """
-    response = client.embeddings.create(
+    response = get_client().embeddings.create(
         input=text,
-        model="text-embedding-3-small"
+        model=EMBED_MODEL
     )
     return response.data[0].embedding
 
+def embed_openai_batch(texts: list[str]):
+    """
+    Embeds many texts with a single request, the API accepts a list as input
+    """
+    response = get_client().embeddings.create(
+        input=list(texts),
+        model=EMBED_MODEL
+    )
+    # Responses carry their input index, don't rely on ordering
+    return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+def embed_local(texts: list[str], dim: int = EMBED_DIM):
+    """
+    Offline stand-in for embed_openai_batch, deterministically hashes each text into a unit vector
+    """
+    out = []
+    for text in texts:
+        seed = int.from_bytes(blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vec  = np.random.default_rng(seed).standard_normal(dim).astype("float32")
+        out.append(vec / np.linalg.norm(vec))
+    return out
+
 def embed(text: str):
     """
     Deterministically hash a string into a float32 vector, and also populate the l2norm for faster cosine similarity 
@@ -35,21 +73,149 @@ CREATE TABLE IF NOT EXISTS vectors (
     dim      INTEGER NOT NULL,
     data     BLOB    NOT NULL,
     l2_norm  REAL    NOT NULL,
-    metadata JSON
+    metadata JSON,
+    encoding TEXT    NOT NULL DEFAULT 'float32',
+    version  INTEGER NOT NULL DEFAULT 0
 );
 CREATE INDEX IF NOT EXISTS idx_vectors_norm ON vectors (l2_norm);
+
+-- Expression indexes on the filterable metadata fields, see search.FILTER_FIELDS
+CREATE INDEX IF NOT EXISTS idx_vectors_source  ON vectors (json_extract(metadata, '$.source'));
+CREATE INDEX IF NOT EXISTS idx_vectors_section ON vectors (json_extract(metadata, '$.section'));
+CREATE INDEX IF NOT EXISTS idx_vectors_date    ON vectors (json_extract(metadata, '$.date'));
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    content_hash TEXT PRIMARY KEY,
+    model        TEXT    NOT NULL,
+    dim          INTEGER NOT NULL,
+    data         BLOB    NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pq_codebooks (
+    name     TEXT PRIMARY KEY,
+    dim      INTEGER NOT NULL,
+    m        INTEGER NOT NULL,
+    ksub     INTEGER NOT NULL,
+    data     BLOB    NOT NULL
+);
+"""
+
+# Readers that keep a copy of the vectors (ann.py, store.py, server.py) pick up new rows by rowid
+# and rewritten ones by version: an upsert or quantize.py convert that changes a row's vector moves
+# it past every version seen so far. Runs after the column migrations, older databases lack version.
+VERSION_DDL = """
+CREATE INDEX IF NOT EXISTS idx_vectors_version ON vectors (version);
+
+CREATE TRIGGER IF NOT EXISTS trg_vectors_version AFTER UPDATE OF dim, data, l2_norm, encoding ON vectors
+WHEN old.data IS NOT new.data OR old.l2_norm IS NOT new.l2_norm BEGIN
+    UPDATE vectors SET version = (SELECT MAX(version) FROM vectors) + 1 WHERE rowid = new.rowid;
+END;
 """
 
+def init_db(con):
+    """
+    Creates the schema, and adds columns introduced after a database was first created
+    """
+    con.executescript(DDL)
+    columns = {row[1] for row in con.execute("PRAGMA table_info(vectors)")}
+    if "encoding" not in columns:
+        con.execute("ALTER TABLE vectors ADD COLUMN encoding TEXT NOT NULL DEFAULT 'float32'")
+    if "version" not in columns:
+        con.execute("ALTER TABLE vectors ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    con.executescript(VERSION_DDL)
+    con.commit()
+
+def changed_rows(con, last_rowid: int, last_version: int):
+    """
+    (rowid, id, dim, data, l2_norm, version) of the rows inserted after last_rowid or rewritten
+    after last_version, in rowid order
+    """
+    return con.execute(
+        """SELECT rowid, id, dim, data, l2_norm, version FROM vectors
+           WHERE rowid > ? OR version > ? ORDER BY rowid""",
+        (last_rowid, last_version),
+    ).fetchall()
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse whitespace so re-indented but otherwise identical chunks hash the same
+    """
+    return " ".join(text.split())
+
+def content_hash(text: str, model: str = EMBED_MODEL) -> str:
+    """
+    blake2b digest of (model, normalized text), used as cache key and as the start of the vector row id
+    """
+    h = blake2b(digest_size=16)
+    h.update(model.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(normalize_text(text).encode("utf-8"))
+    return h.hexdigest()
+
+# Metadata keys that identify the document a chunk came from, part of its row id
+DOCUMENT_FIELDS = ("source", "section")
+
+def row_id(text_hash: str, metadata: dict | None = None) -> str:
+    """
+    vectors.id of a chunk: its content hash, then ':' and a digest of the document it came from when
+    the metadata names one. The same chunk in two documents keeps one row (and metadata) per
+    document, while the embedding is still cached once under the content hash.
+    """
+    document = {k: (metadata or {})[k] for k in DOCUMENT_FIELDS if (metadata or {}).get(k) is not None}
+    if not document:
+        return text_hash
+    h = blake2b(json.dumps(document, sort_keys=True).encode("utf-8"), digest_size=8)
+    return f"{text_hash}:{h.hexdigest()}"
+
+def cache_key(vid: str) -> str:
+    """
+    The embedding_cache key of a row id built by row_id
+    """
+    return vid.split(":", 1)[0]
+
 def insert_batch(cur, rows):
+    # Rows are keyed by row_id, re-ingesting a chunk of the same document updates it in place instead of duplicating
     cur.executemany(
-        "INSERT INTO vectors (id, dim, data, l2_norm, metadata) VALUES (?,?,?,?,?)",
+        """INSERT INTO vectors (id, dim, data, l2_norm, metadata, encoding) VALUES (?,?,?,?,?,?)
+           ON CONFLICT(id) DO UPDATE SET
+               dim=excluded.dim, data=excluded.data, l2_norm=excluded.l2_norm,
+               metadata=excluded.metadata, encoding=excluded.encoding""",
+        rows,
+    )
+    # Stores ingested before row ids carried the document keyed the chunk by its bare content hash,
+    # that row is replaced by the one above when it belongs to the same document
+    cur.executemany(
+        """DELETE FROM vectors WHERE id = ?
+           AND json_extract(metadata, '$.source') IS json_extract(?, '$.source')
+           AND json_extract(metadata, '$.section') IS json_extract(?, '$.section')""",
+        [(cache_key(row[0]), row[4], row[4]) for row in rows if ":" in row[0]],
+    )
+
+def lookup_cache(cur, hashes: list[str]):
+    """
+    Returns {content_hash: float32 vector} for the hashes already embedded
+    """
+    if not hashes:
+        return {}
+    placeholders = ",".join("?" * len(hashes))
+    rows = cur.execute(
+        f"SELECT content_hash, dim, data FROM embedding_cache WHERE content_hash IN ({placeholders})",
+        list(hashes),
+    ).fetchall()
+    return {h: np.frombuffer(blob, dtype="float32", count=dim) for h, dim, blob in rows}
+
+def store_cache(cur, rows):
+    """
+    rows are (content_hash, model, dim, data)
+    """
+    cur.executemany(
+        "INSERT OR REPLACE INTO embedding_cache (content_hash, model, dim, data) VALUES (?,?,?,?)",
         rows,
     )
 
 def main():
     con = sqlite3.connect("./localvector.db")
-    con.executescript(DDL)
-    cur = con.cursor()
+    init_db(con)
 
     text_sample = """
         Buah Batu Regency, F5 no 3 
@@ -167,34 +333,11 @@ def main():
 
         """
 
-    pending = []
-    text_sample = text_sample.split("\n\n")
-    for i, line in enumerate(text_sample):
-        text = line.strip()
-        if not text:
-            continue
-        vec, l2norm = embed(text)
-        pending.append(
-                (str(uuid.uuid4()),
-                len(vec),
-                vec.astype("float32").tobytes(),
-                float(l2norm),
-                json.dumps({"text": text}))
-        )
-        # Commit in batches of 5
-        if len(pending) >= 5:
-            insert_batch(cur, pending)
-            con.commit()
-            pending.clear()
-            print(f"batch number {i/5}")
-
-
-    # Final commit
-    if pending:
-        insert_batch(cur, pending)
-        con.commit()
-    
-    print("finished")
+    from ingest import ingest
+    from chunking import chunk_text
+
+    stats = ingest(con, chunk_text(text_sample))
+    print(f"finished, {stats['chunks']} chunks at {stats['chunks_per_sec']:.1f} chunks/sec")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,407 @@
+import argparse, sqlite3, time
+from collections import Counter
+import numpy as np
+
+from populatevector import cache_key, init_db, lookup_cache
+from search import DB_FILE, VectorIndex, filter_clause, top_k_from_scores
+
+# Per-row encodings of the vectors.data BLOB
+#   float32 : dim * 4 bytes, the original format
+#   float16 : dim * 2 bytes
+#   int8    : 4 byte float32 scale followed by dim int8 codes, v ~= scale * codes
+#   pq      : m uint8 codes, one centroid id per sub-vector of the "default" codebook
+ENCODINGS = ("float32", "float16", "int8", "pq")
+
+PQ_KSUB     = 256
+PQ_SUBDIM   = 4        # dims per sub-vector, 1536 dims -> m = 384 bytes per vector
+PQ_ITERS    = 15
+SCORE_CHUNK = 65536    # rows decoded at a time while scoring, bounds the float32 working set
+RERANK      = 10       # full precision rerank of top_k * RERANK candidates
+
+
+def kmeans(x, k: int, iters: int, rng):
+    """
+    Plain euclidean k-means, returns (k, dim) centroids
+    """
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = nearest(x, centroids)
+        sums   = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty  = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def nearest(x, centroids):
+    # ||x - c||^2 up to the ||x||^2 term, which does not change the argmin
+    return np.argmin((centroids ** 2).sum(axis=1) - 2 * (x @ centroids.T), axis=1)
+
+
+class PQCodebook:
+    """
+    Product quantizer: the vector is split into m sub-vectors, each replaced by the id of its
+    nearest of ksub sub-centroids. Queries are scored against codes with an (m, ksub) lookup table.
+    """
+
+    def __init__(self, centroids):
+        self.centroids = np.asarray(centroids, dtype="float32")   # (m, ksub, subdim)
+
+    @property
+    def m(self):
+        return self.centroids.shape[0]
+
+    @property
+    def ksub(self):
+        return self.centroids.shape[1]
+
+    @property
+    def dim(self):
+        return self.centroids.shape[0] * self.centroids.shape[2]
+
+    @classmethod
+    def train(cls, vectors, m: int | None = None, ksub: int = PQ_KSUB, iters: int = PQ_ITERS, seed: int = 0):
+        vectors = np.asarray(vectors, dtype="float32")
+        n, dim  = vectors.shape
+        m       = m or dim // PQ_SUBDIM
+        if dim % m:
+            raise ValueError(f"dim {dim} is not divisible into {m} sub-vectors")
+        ksub = min(ksub, n)
+
+        rng = np.random.default_rng(seed)
+        if n > ksub * 256:
+            vectors = vectors[rng.choice(n, ksub * 256, replace=False)]
+        subs = vectors.reshape(len(vectors), m, dim // m)
+        return cls(np.stack([kmeans(subs[:, j], ksub, iters, rng) for j in range(m)]))
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype="float32").reshape(-1, self.m, self.dim // self.m)
+        codes   = np.empty((len(vectors), self.m), dtype="uint8")
+        for j in range(self.m):
+            codes[:, j] = nearest(vectors[:, j], self.centroids[j])
+        return codes
+
+    def decode(self, codes):
+        return self.centroids[np.arange(self.m), codes].reshape(len(codes), self.dim)
+
+    def lut(self, query_vec):
+        q = np.asarray(query_vec, dtype="float32").reshape(self.m, 1, self.dim // self.m)
+        return (self.centroids * q).sum(axis=2)     # (m, ksub) partial inner products
+
+    def save(self, con, name: str = "default"):
+        con.execute(
+            "INSERT OR REPLACE INTO pq_codebooks (name, dim, m, ksub, data) VALUES (?,?,?,?,?)",
+            (name, self.dim, self.m, self.ksub, self.centroids.tobytes()),
+        )
+        con.commit()
+
+    @classmethod
+    def load(cls, con, name: str = "default"):
+        row = con.execute("SELECT dim, m, ksub, data FROM pq_codebooks WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        dim, m, ksub, blob = row
+        return cls(np.frombuffer(blob, dtype="float32").reshape(m, ksub, dim // m))
+
+
+def encode_vectors(vectors, encoding: str = "float32", codebook: PQCodebook | None = None) -> list[bytes]:
+    """
+    Encodes a (n, dim) batch into one vectors.data BLOB per row
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    if encoding == "float32":
+        return [v.tobytes() for v in vectors]
+    if encoding == "float16":
+        return [v.tobytes() for v in vectors.astype("float16")]
+    if encoding == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        codes  = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype("int8")
+        return [np.float32(s).tobytes() + c.tobytes() for s, c in zip(scales, codes)]
+    if encoding == "pq":
+        if codebook is None:
+            raise ValueError("pq encoding needs a trained codebook, run: python quantize.py train-pq")
+        return [c.tobytes() for c in codebook.encode(vectors)]
+    raise ValueError(f"Unknown encoding {encoding!r}, expected one of {ENCODINGS}")
+
+
+def decode_vectors(blobs, dim: int, encoding: str, codebook: PQCodebook | None = None):
+    """
+    Back from vectors.data BLOBs of one encoding to a (n, dim) float32 batch, approximate for the
+    compressed encodings
+    """
+    if encoding == "float32":
+        return np.frombuffer(b"".join(blobs), dtype="float32").reshape(len(blobs), dim)
+    if encoding == "float16":
+        return np.frombuffer(b"".join(blobs), dtype="float16").reshape(len(blobs), dim).astype("float32")
+    if encoding == "int8":
+        scales = np.frombuffer(b"".join(b[:4] for b in blobs), dtype="float32")
+        codes  = np.frombuffer(b"".join(b[4:] for b in blobs), dtype="int8").reshape(len(blobs), dim)
+        return codes.astype("float32") * scales[:, None]
+    if encoding == "pq":
+        if codebook is None:
+            raise ValueError("Rows are pq encoded but no codebook was given")
+        return codebook.decode(np.frombuffer(b"".join(blobs), dtype="uint8").reshape(len(blobs), codebook.m))
+    raise ValueError(f"Unknown encoding {encoding!r}")
+
+
+def encode_vector(vec, encoding: str = "float32", codebook: PQCodebook | None = None) -> bytes:
+    return encode_vectors(np.asarray(vec, dtype="float32")[None, :], encoding, codebook)[0]
+
+
+def cache_lookup(db_file: str = DB_FILE):
+    """
+    full_lookup for QuantizedIndex: row ids start with their embedding_cache key (see
+    populatevector.row_id), the cache keeps the float32 originals. Each call opens and closes its own connection, so the index owns no
+    connection and can be searched from any thread.
+    """
+    def lookup(ids):
+        con = sqlite3.connect(db_file)
+        try:
+            full = lookup_cache(con.cursor(), list({cache_key(vid) for vid in ids}))
+            return {vid: full[cache_key(vid)] for vid in ids if cache_key(vid) in full}
+        finally:
+            con.close()
+    return lookup
+
+
+class QuantizedIndex:
+    """
+    Scores queries directly against compressed codes. Only SCORE_CHUNK rows are ever widened to
+    float32 at once, so the resident index is the compressed size. The best top_k * rerank
+    candidates are optionally re-scored with full precision vectors from full_lookup(ids).
+    """
+
+    def __init__(self, ids, encoding, codes, norms, scales=None, codebook=None, full_lookup=None):
+        self.ids         = list(ids)
+        self.encoding    = encoding
+        self.codes       = codes
+        self.norms       = norms
+        self.scales      = scales
+        self.codebook    = codebook
+        self.full_lookup = full_lookup
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.codebook.dim if self.encoding == "pq" else self.codes.shape[1]
+
+    def take(self, positions):
+        """
+        The rows at positions as a new index, sharing the codebook and full_lookup
+        """
+        return QuantizedIndex([self.ids[i] for i in positions], self.encoding, self.codes[positions], self.norms[positions],
+                              None if self.scales is None else self.scales[positions], self.codebook, self.full_lookup)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def from_rows(cls, rows, codebook=None, full_lookup=None):
+        """
+        Build the index from (id, dim, data, l2_norm, encoding) rows. A store converted with
+        convert still gets float32 rows from later ingests, rows in another encoding than the
+        store's (its most common compressed one) are re-encoded to it here.
+        """
+        if not rows:
+            return cls([], "float32", np.empty((0, 0), dtype="float32"), np.empty(0, dtype="float32"))
+        counts     = Counter(row[4] for row in rows)
+        compressed = Counter({enc: n for enc, n in counts.items() if enc != "float32"})
+        encoding   = (compressed or counts).most_common(1)[0][0]
+        dim        = rows[0][1]
+        if len(counts) > 1:
+            rows = cls._reencode(rows, dim, encoding, codebook)
+        ids      = [row[0] for row in rows]
+        norms    = np.fromiter((row[3] for row in rows), dtype="float32", count=len(rows))
+        blobs    = [row[2] for row in rows]
+
+        scales = None
+        if encoding == "float32":
+            codes = np.frombuffer(b"".join(blobs), dtype="float32").reshape(len(rows), dim)
+        elif encoding == "float16":
+            codes = np.frombuffer(b"".join(blobs), dtype="float16").reshape(len(rows), dim)
+        elif encoding == "int8":
+            scales = np.frombuffer(b"".join(b[:4] for b in blobs), dtype="float32")
+            codes  = np.frombuffer(b"".join(b[4:] for b in blobs), dtype="int8").reshape(len(rows), dim)
+        elif encoding == "pq":
+            if codebook is None:
+                raise ValueError("Store is pq encoded but no codebook was given")
+            codes = np.frombuffer(b"".join(blobs), dtype="uint8").reshape(len(rows), codebook.m)
+        else:
+            raise ValueError(f"Unknown encoding {encoding!r}")
+        return cls(ids, encoding, codes, norms, scales, codebook, full_lookup)
+
+    @staticmethod
+    def _reencode(rows, dim: int, encoding: str, codebook=None):
+        odd = {}
+        for i, row in enumerate(rows):
+            if row[4] != encoding:
+                odd.setdefault(row[4], []).append(i)
+        rows = list(rows)
+        for source, positions in odd.items():
+            vectors = decode_vectors([rows[i][2] for i in positions], dim, source, codebook)
+            for i, blob in zip(positions, encode_vectors(vectors, encoding, codebook)):
+                vid, dim_, _, l2_norm, _ = rows[i]
+                rows[i] = (vid, dim_, blob, l2_norm, encoding)
+        return rows
+
+    @classmethod
+    def from_sqlite(cls, db_file: str = DB_FILE, filters: dict | None = None):
+        where, params = filter_clause(filters)
+        con = sqlite3.connect(db_file)
+        try:
+            init_db(con)
+            rows     = con.execute("SELECT id, dim, data, l2_norm, encoding FROM vectors" + where, params).fetchall()
+            codebook = PQCodebook.load(con)
+        finally:
+            con.close()
+        return cls.from_rows(rows, codebook, full_lookup=cache_lookup(db_file))
+
+    def scores(self, query_vec):
+        q      = np.asarray(query_vec, dtype="float32")
+        q_norm = np.linalg.norm(q)
+
+        if self.encoding == "pq":
+            lut = self.codebook.lut(q)
+            ip  = np.empty(len(self.codes), dtype="float32")
+            for start in range(0, len(self.codes), SCORE_CHUNK):
+                chunk = self.codes[start:start + SCORE_CHUNK]
+                ip[start:start + SCORE_CHUNK] = lut[np.arange(self.codebook.m), chunk].sum(axis=1)
+        else:
+            ip = np.empty(len(self.codes), dtype="float32")
+            for start in range(0, len(self.codes), SCORE_CHUNK):
+                ip[start:start + SCORE_CHUNK] = self.codes[start:start + SCORE_CHUNK].astype("float32") @ q
+            if self.scales is not None:
+                ip *= self.scales
+        return ip / (self.norms * q_norm + 1e-9)
+
+    def search_batch(self, query_vecs, top_k: int = 5, rerank: int = RERANK):
+        """
+        One [(cosine, id), ...] list per query, same interface as VectorIndex.search_batch
+        """
+        return [self.search(q, top_k, rerank) for q in np.atleast_2d(np.asarray(query_vecs, dtype="float32"))]
+
+    def search(self, query_vec, top_k: int = 5, rerank: int = RERANK):
+        """
+        Returns [(cosine, id), ...] best first. rerank=0 returns the compressed scores as is.
+        """
+        if not self.ids:
+            return []
+        if not rerank or self.full_lookup is None or self.encoding == "float32":
+            return top_k_from_scores(self.scores(query_vec), self.ids, top_k)
+
+        candidates = top_k_from_scores(self.scores(query_vec), self.ids, top_k * rerank)
+        full       = self.full_lookup([vid for _, vid in candidates])
+        q          = np.asarray(query_vec, dtype="float32")
+        q_norm     = np.linalg.norm(q)
+
+        # Candidates without a full precision copy keep their compressed score
+        rescored = []
+        for score, vid in candidates:
+            if vid in full:
+                v     = full[vid]
+                score = float(v @ q / (np.linalg.norm(v) * q_norm + 1e-9))
+            rescored.append((score, vid))
+        rescored.sort(key=lambda x: x[0], reverse=True)
+        return rescored[:top_k]
+
+
+def convert(db_file: str, encoding: str):
+    """
+    Re-encodes every float32 row of the store in place, returns how many rows changed
+    """
+    con = sqlite3.connect(db_file)
+    init_db(con)
+    try:
+        codebook = PQCodebook.load(con) if encoding == "pq" else None
+        if encoding == "pq" and codebook is None:
+            raise ValueError("Train a codebook first: python quantize.py train-pq")
+        rows = con.execute("SELECT id, dim, data, l2_norm FROM vectors WHERE encoding = 'float32'").fetchall()
+        flat = VectorIndex.from_rows(rows)
+        con.executemany(
+            "UPDATE vectors SET data = ?, encoding = ? WHERE id = ?",
+            [(blob, encoding, vid) for vid, blob in zip(flat.ids, encode_vectors(flat.matrix, encoding, codebook))],
+        )
+        con.commit()
+    finally:
+        con.close()
+    return len(rows)
+
+
+def bench(n: int, dim: int, queries: int, top_k: int):
+    """
+    Memory, latency and recall@k of every encoding on synthetic clustered vectors
+    """
+    rng     = np.random.default_rng(0)
+    centers = rng.standard_normal((max(1, n // 1000), dim)).astype("float32")
+    vectors = centers[rng.integers(len(centers), size=n)] + 0.5 * rng.standard_normal((n, dim)).astype("float32")
+    ids     = [str(i) for i in range(n)]
+    norms   = np.linalg.norm(vectors, axis=1)
+    qs      = vectors[rng.choice(n, queries, replace=False)] + 0.1 * rng.standard_normal((queries, dim)).astype("float32")
+
+    exact = VectorIndex(ids, vectors, norms)
+    truth = [{vid for _, vid in exact.search(q, top_k)} for q in qs]
+    full  = dict(zip(ids, vectors))
+
+    codebook = PQCodebook.train(vectors)
+    print(f"{n} vectors x {dim} dims, recall@{top_k} over {queries} queries")
+    print(f"{'encoding':>8} {'rerank':>6} {'MB':>8} {'ms/query':>9} {'recall':>7}")
+    for encoding in ENCODINGS:
+        rows  = [(vid, dim, blob, float(nm), encoding)
+                 for vid, blob, nm in zip(ids, encode_vectors(vectors, encoding, codebook), norms)]
+        index = QuantizedIndex.from_rows(rows, codebook, full_lookup=lambda vids: {v: full[v] for v in vids})
+        for rerank in ((0,) if encoding == "float32" else (0, RERANK)):
+            start = time.perf_counter()
+            found = [{vid for _, vid in index.search(q, top_k, rerank)} for q in qs]
+            ms    = (time.perf_counter() - start) / queries * 1000
+            rec   = sum(len(f & t) for f, t in zip(found, truth)) / (top_k * queries)
+            print(f"{encoding:>8} {rerank:>6} {index.nbytes / 2**20:>8.1f} {ms:>9.3f} {rec:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed vector encodings for localvector.db")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train-pq", help="train the product quantizer on the float32 rows of the store")
+    train.add_argument("--db", default=DB_FILE)
+    train.add_argument("--m", type=int, help="number of sub-vectors, defaults to dim / %d" % PQ_SUBDIM)
+
+    conv = sub.add_parser("convert", help="re-encode the float32 rows of the store")
+    conv.add_argument("encoding", choices=ENCODINGS[1:])
+    conv.add_argument("--db", default=DB_FILE)
+
+    b = sub.add_parser("bench", help="memory / latency / recall per encoding on synthetic vectors")
+    b.add_argument("--n", type=int, default=20000)
+    b.add_argument("--dim", type=int, default=1536)
+    b.add_argument("--queries", type=int, default=50)
+    b.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "train-pq":
+        con = sqlite3.connect(args.db)
+        init_db(con)
+        # The float32 rows of the store, or the float32 originals in the embedding cache
+        rows = con.execute("SELECT id, dim, data, l2_norm FROM vectors WHERE encoding = 'float32'").fetchall()
+        if not rows:
+            rows = con.execute("SELECT content_hash, dim, data, 0 FROM embedding_cache").fetchall()
+        if not rows:
+            raise SystemExit("No float32 vectors to train the codebook on")
+        flat     = VectorIndex.from_rows(rows)
+        codebook = PQCodebook.train(flat.matrix, args.m)
+        codebook.save(con)
+        con.close()
+        print(f"trained pq codebook m={codebook.m} ksub={codebook.ksub} on {len(flat)} vectors")
+    elif args.command == "convert":
+        print(f"re-encoded {convert(args.db, args.encoding)} rows as {args.encoding}")
+    else:
+        bench(args.n, args.dim, args.queries, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
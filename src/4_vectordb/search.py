@@ -0,0 +1,178 @@
+import sqlite3, json
+import numpy as np
+
+DB_FILE      = "./localvector.db"
+SEARCH_CHUNK = 16384    # corpus rows scored per block in search_batch, bounds the score matrix
+
+# Metadata fields that can be filtered on, each backed by an expression index in populatevector.DDL
+FILTER_FIELDS = ("source", "section", "date")
+FILTER_OPS    = {"eq": "=", "ne": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "in": "IN"}
+
+
+def filter_clause(filters: dict | None):
+    """
+    Turns {"source": "cv.txt", "date__gte": "2024-01-01", "section__in": [...]} into a
+    WHERE clause and its parameters. A list value without an operator means IN.
+    """
+    if not filters:
+        return "", []
+
+    conditions, params = [], []
+    for key, value in filters.items():
+        field, _, op = key.partition("__")
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter on {field!r}, filterable fields are {FILTER_FIELDS}")
+        op = op or ("in" if isinstance(value, (list, tuple, set)) else "eq")
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter operator {op!r}, expected one of {tuple(FILTER_OPS)}")
+
+        # Must match the indexed expression exactly for SQLite to use the index
+        column = f"json_extract(metadata, '$.{field}')"
+        if op == "in":
+            value = list(value)
+            conditions.append(f"{column} IN ({','.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            conditions.append(f"{column} {FILTER_OPS[op]} ?")
+            params.append(value)
+    return " WHERE " + " AND ".join(conditions), params
+
+
+class CompressedStoreError(ValueError):
+    """The store holds float16 / int8 / pq rows, which quantize.QuantizedIndex searches"""
+
+
+class VectorIndex:
+    """
+    All vectors of the store held as one contiguous float32 matrix, so a query is scored
+    with a single matrix-vector product instead of a python loop over the cursor
+    """
+
+    def __init__(self, ids, matrix, norms):
+        self.ids    = list(ids)
+        self.matrix = matrix
+        self.norms  = norms
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def take(self, positions):
+        """
+        The rows at positions as a new index
+        """
+        return VectorIndex([self.ids[i] for i in positions], self.matrix[positions], self.norms[positions])
+
+    @classmethod
+    def from_sqlite(cls, db_file: str = DB_FILE, filters: dict | None = None):
+        """
+        Loads the vectors matching filters (see filter_clause), the filtering runs inside SQLite
+        """
+        where, params = filter_clause(filters)
+        con = sqlite3.connect(db_file)
+        try:
+            rows = con.execute("SELECT id, dim, data, l2_norm FROM vectors" + where, params).fetchall()
+        finally:
+            con.close()
+        return cls.from_rows(rows)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build the index from (id, dim, data, l2_norm) rows, every row must share the same dim
+        """
+        if not rows:
+            return cls([], np.empty((0, 0), dtype="float32"), np.empty(0, dtype="float32"))
+
+        dims = {row[1] for row in rows}
+        if len(dims) != 1:
+            raise ValueError(f"Mixed vector dimensions in store: {sorted(dims)}")
+        dim = dims.pop()
+        if any(len(row[2]) != dim * 4 for row in rows):
+            raise CompressedStoreError("Store holds compressed vectors, search it with quantize.QuantizedIndex")
+
+        # One join + one frombuffer instead of a frombuffer per row
+        matrix = np.frombuffer(b"".join(row[2] for row in rows), dtype="float32").reshape(len(rows), dim)
+        norms  = np.fromiter((row[3] for row in rows), dtype="float32", count=len(rows))
+        return cls((row[0] for row in rows), matrix, norms)
+
+    def scores(self, query_vec):
+        """
+        Cosine similarity of the query against every stored vector
+        """
+        q      = np.asarray(query_vec, dtype="float32")
+        q_norm = np.linalg.norm(q)
+        return (self.matrix @ q) / (self.norms * q_norm + 1e-9)
+
+    def search(self, query_vec, top_k: int = 5):
+        """
+        Returns [(cosine, id), ...] for the top_k best matches, best first
+        """
+        if not self.ids:
+            return []
+        return top_k_from_scores(self.scores(query_vec), self.ids, top_k)
+
+    def search_batch(self, query_vecs, top_k: int = 5, chunk_rows: int = SEARCH_CHUNK):
+        """
+        Scores N queries at once as matrix-matrix products over blocks of chunk_rows vectors,
+        keeping a running top_k per query. Returns one [(cosine, id), ...] list per query.
+        """
+        q = np.atleast_2d(np.asarray(query_vecs, dtype="float32"))
+        if not self.ids:
+            return [[] for _ in q]
+        q_norms = np.linalg.norm(q, axis=1)
+        k       = min(top_k, len(self.ids))
+
+        best_scores = np.empty((len(q), 0), dtype="float32")
+        best_idx    = np.empty((len(q), 0), dtype="int64")
+        for start in range(0, len(self.ids), chunk_rows):
+            block  = self.matrix[start:start + chunk_rows]
+            scores = (q @ block.T) / (q_norms[:, None] * self.norms[None, start:start + chunk_rows] + 1e-9)
+
+            # Merge this block's candidates with the running best, keep k per query
+            block_idx = np.broadcast_to(np.arange(start, start + len(block)), (len(q), len(block)))
+            scores    = np.concatenate([best_scores, scores], axis=1)
+            idx       = np.concatenate([best_idx, block_idx], axis=1)
+            if scores.shape[1] > k:
+                part   = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, part, axis=1)
+                idx    = np.take_along_axis(idx, part, axis=1)
+            best_scores, best_idx = scores, idx
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_idx    = np.take_along_axis(best_idx, order, axis=1)
+        return [[(float(s), self.ids[i]) for s, i in zip(row_s, row_i)]
+                for row_s, row_i in zip(best_scores, best_idx)]
+
+
+def top_k_from_scores(scores, ids, top_k: int):
+    """
+    argpartition picks the top_k in O(n), only the winners get fully sorted
+    """
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return []
+    idx = np.argpartition(-scores, top_k - 1)[:top_k]
+    idx = idx[np.argsort(-scores[idx])]
+    return [(float(scores[i]), ids[i]) for i in idx]
+
+
+def fetch_metadata(ids, db_file: str = DB_FILE):
+    """
+    Decode the metadata JSON only for the given ids, returns {id: metadata dict}
+    """
+    if not ids:
+        return {}
+    con = sqlite3.connect(db_file)
+    try:
+        placeholders = ",".join("?" * len(ids))
+        rows = con.execute(
+            f"SELECT id, metadata FROM vectors WHERE id IN ({placeholders})", list(ids)
+        ).fetchall()
+    finally:
+        con.close()
+    return {vid: (json.loads(meta) if meta else {}) for vid, meta in rows}
@@ -0,0 +1,268 @@
+import argparse, json, sqlite3, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+
+from populatevector import changed_rows, embed_openai_batch, embed_local, init_db
+from quantize import QuantizedIndex
+from search import DB_FILE, CompressedStoreError, VectorIndex, fetch_metadata, filter_clause
+
+HOST            = "127.0.0.1"
+PORT            = 8765
+WORKERS         = 8
+REFRESH_SECONDS = 5.0
+TOP_K           = 5
+
+
+class WarmIndex:
+    """
+    The vector matrix loaded once and kept in memory. refresh() appends rows inserted since the
+    last load (by rowid), swaps in rows rewritten since then (by version) and publishes the new
+    index, readers always see a complete index.
+    """
+
+    def __init__(self, db_file: str = DB_FILE):
+        self.db_file      = db_file
+        # (index, id -> row position), replaced as one tuple so a reader never pairs the positions
+        # of one refresh with the matrix of another
+        self.state        = (VectorIndex.from_rows([]), {})
+        self.last_rowid   = 0
+        self.last_version = 0
+        self._lock        = threading.Lock()   # one refresh at a time, searches never take it
+
+        con = sqlite3.connect(db_file)
+        try:
+            init_db(con)
+        finally:
+            con.close()
+
+    @property
+    def index(self) -> VectorIndex:
+        return self.state[0]
+
+    def refresh(self):
+        with self._lock:
+            con = sqlite3.connect(self.db_file)
+            try:
+                rows = changed_rows(con, self.last_rowid, self.last_version)
+            finally:
+                con.close()
+            if not rows:
+                return 0
+
+            merged = self._merge(*self.state, rows)
+            self.state        = (merged, {vid: i for i, vid in enumerate(merged.ids)})
+            self.last_rowid   = max(self.last_rowid, rows[-1][0])
+            self.last_version = max(self.last_version, max(row[5] for row in rows))
+            return len(rows)
+
+    def _merge(self, old, positions, rows):
+        if not isinstance(old, QuantizedIndex):
+            try:
+                new = VectorIndex.from_rows([row[1:5] for row in rows])
+                if not len(old):
+                    return new
+                updated = [i for i, vid in enumerate(new.ids) if vid in positions]
+                added   = [i for i, vid in enumerate(new.ids) if vid not in positions]
+                matrix, norms = old.matrix, old.norms
+                if updated:
+                    # Copies, searches still holding the old index keep scoring an unchanged matrix
+                    target = [positions[new.ids[i]] for i in updated]
+                    matrix, norms = matrix.copy(), norms.copy()
+                    matrix[target] = new.matrix[updated]
+                    norms[target]  = new.norms[updated]
+                return VectorIndex(old.ids + [new.ids[i] for i in added], np.vstack([matrix, new.matrix[added]]),
+                                   np.concatenate([norms, new.norms[added]]))
+            except CompressedStoreError:
+                pass
+        # A store re-encoded by quantize.py convert, its codes are small enough to reload whole
+        return QuantizedIndex.from_sqlite(self.db_file)
+
+    def matching_positions(self, filters: dict, positions: dict):
+        where, params = filter_clause(filters)
+        con = sqlite3.connect(self.db_file)
+        try:
+            ids = [row[0] for row in con.execute("SELECT id FROM vectors" + where, params)]
+        finally:
+            con.close()
+        return np.fromiter((positions[vid] for vid in ids if vid in positions), dtype="int64")
+
+    def search(self, query_vecs, top_k: int = TOP_K, filters: dict | None = None):
+        index, positions = self.state
+        if filters:
+            # Filters run in SQLite against the indexed metadata, only matching rows are scored
+            pos   = self.matching_positions(filters, positions)
+            index = index.take(pos)
+        # Never ask for more neighbours than there are rows to rank
+        return index.search_batch(query_vecs, min(top_k, max(len(index), 1)))
+
+
+def parse_top_k(value) -> int:
+    """
+    top_k from a request body: TOP_K when absent, otherwise it has to be a positive integer
+    """
+    if value is None:
+        return TOP_K
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError("top_k must be a positive integer")
+    return value
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    Serves each connection on a bounded thread pool instead of a thread per request
+    """
+
+    def __init__(self, address, handler, workers: int = WORKERS):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class LatencyStats:
+    def __init__(self, keep: int = 10000):
+        self.keep    = keep
+        self.samples = []
+        self._lock   = threading.Lock()
+
+    def add(self, ms: float):
+        with self._lock:
+            self.samples.append(ms)
+            if len(self.samples) > self.keep:
+                del self.samples[: len(self.samples) - self.keep]
+
+    def summary(self):
+        with self._lock:
+            samples = list(self.samples)
+        if not samples:
+            return {"count": 0}
+        return {"count": len(samples),
+                "p50_ms": float(np.percentile(samples, 50)),
+                "p99_ms": float(np.percentile(samples, 99))}
+
+
+def make_handler(warm: WarmIndex, embed_fn, stats: LatencyStats, startup: dict):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: dict):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok", "vectors": len(warm.index)})
+            elif self.path == "/stats":
+                self._send(200, {"vectors": len(warm.index), **startup, "warm_search": stats.summary()})
+            else:
+                self._send(404, {"status": "error", "message": "not found"})
+
+        def do_POST(self):
+            if self.path != "/search":
+                return self._send(404, {"status": "error", "message": "not found"})
+            try:
+                body    = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                queries = body.get("queries") or []
+                if isinstance(queries, str):
+                    queries = [queries]
+                if not queries:
+                    return self._send(400, {"status": "error", "message": "queries is required"})
+                top_k = parse_top_k(body.get("top_k"))
+
+                start   = time.perf_counter()
+                vecs    = embed_fn(queries)
+                t_embed = time.perf_counter()
+                results = warm.search(vecs, top_k, body.get("filters"))
+                t_search = time.perf_counter()
+                stats.add((t_search - t_embed) * 1000)
+
+                meta = fetch_metadata(list({vid for top in results for _, vid in top}), warm.db_file)
+                self._send(200, {
+                    "status": "success",
+                    "results": [
+                        [{"id": vid, "cosine": cos, "text": meta.get(vid, {}).get("text", "")} for cos, vid in top]
+                        for top in results
+                    ],
+                    "embed_ms": (t_embed - start) * 1000,
+                    "search_ms": (t_search - t_embed) * 1000,
+                })
+            except (ValueError, TypeError) as e:
+                self._send(400, {"status": "error", "message": str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident vector search service with a warm in-memory index")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--refresh", type=float, default=REFRESH_SECONDS, help="seconds between polls for new rows")
+    parser.add_argument("--local", action="store_true", help="embed queries with the offline hash embedder")
+    args = parser.parse_args()
+
+    embed_fn = embed_local if args.local else embed_openai_batch
+
+    # Cold start, this is what every fresh `python main.py` run pays before its first query
+    start = time.perf_counter()
+    warm  = WarmIndex(args.db)
+    warm.refresh()
+    load_s = time.perf_counter() - start
+    if len(warm.index):
+        probe = np.ones((1, warm.index.dim), dtype="float32")
+        t0 = time.perf_counter()
+        warm.search(probe)
+        first_ms = (time.perf_counter() - t0) * 1000
+    else:
+        first_ms = 0.0
+    startup = {"cold_load_s": load_s, "first_search_ms": first_ms}
+    print(f"loaded {len(warm.index)} vectors in {load_s:.3f}s, first search {first_ms:.2f}ms")
+
+    def poll():
+        while True:
+            time.sleep(args.refresh)
+            try:
+                added = warm.refresh()
+            except Exception as e:
+                # A locked database or a bad row must not stop the polling, the next poll retries
+                print(f"refresh failed: {e!r}")
+                continue
+            if added:
+                print(f"refreshed, +{added} vectors ({len(warm.index)} total)")
+
+    threading.Thread(target=poll, daemon=True).start()
+
+    stats  = LatencyStats()
+    server = PooledHTTPServer((args.host, args.port), make_handler(warm, embed_fn, stats, startup), args.workers)
+    print(f"serving on http://{args.host}:{args.port} (POST /search, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import argparse, json, os, shutil, sqlite3
+import numpy as np
+
+from populatevector import changed_rows, init_db
+from quantize import QuantizedIndex
+from search import DB_FILE, CompressedStoreError, VectorIndex
+
+# SQLite stays the source of truth for ids and metadata, this is a read-optimised copy of the
+# embeddings: one flat float32 file (row i at byte offset i * dim * 4) plus a JSON sidecar holding
+# the id and l2 norm of every row, in file order. Every sync writes a new generation of the flat
+# file and then swaps the sidecar, so a process still mapping the previous generation never sees a
+# row change under it, and ids, norms and vectors always come from the same sync.
+
+
+def store_paths(db_file: str = DB_FILE, generation: int | None = None):
+    """
+    localvector.db -> (localvector.vec.<generation>.f32, localvector.vec.json). Sidecars written
+    before files were versioned have no generation and point at localvector.vec.f32.
+    """
+    base = os.path.splitext(db_file)[0]
+    data = base + ".vec.f32" if generation is None else f"{base}.vec.{generation}.f32"
+    return data, base + ".vec.json"
+
+
+def _read_sidecar(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_sidecar(path, sidecar):
+    # Write then rename, readers never see a half written sidecar
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f)
+    os.replace(tmp, path)
+
+
+def _db_state(con):
+    """
+    (row count, max rowid, max version) of the vectors table, what a current sidecar records
+    """
+    count, last_rowid, last_version = con.execute(
+        "SELECT COUNT(*), COALESCE(MAX(rowid), 0), COALESCE(MAX(version), 0) FROM vectors"
+    ).fetchone()
+    return count, last_rowid, last_version
+
+
+def sync_mmap(db_file: str = DB_FILE, rebuild: bool = False):
+    """
+    Writes the next generation of the flat file: a copy of the current one with the rows inserted
+    since the last sync (by rowid) appended and the rows rewritten since then (by version)
+    overwritten, or everything from scratch with rebuild or once rows have been deleted. The
+    sidecar is swapped in last and the previous generation removed. Returns how many rows were
+    written.
+    """
+    _, meta_path = store_paths(db_file)
+    old      = _read_sidecar(meta_path) if os.path.exists(meta_path) else None
+    old_path = store_paths(db_file, old.get("generation"))[0] if old else None
+    blank    = {"dim": None, "count": 0, "last_rowid": 0, "last_version": 0, "ids": [], "norms": []}
+
+    con = sqlite3.connect(db_file)
+    try:
+        init_db(con)
+        fresh   = rebuild or old is None or not os.path.exists(old_path)
+        sidecar = dict(blank) if fresh else dict(old, ids=list(old["ids"]), norms=list(old["norms"]))
+        sidecar.setdefault("last_version", 0)
+        rows    = changed_rows(con, sidecar["last_rowid"], sidecar["last_version"])
+
+        # Syncing is incremental, a deleted row can only be dropped by writing the file again
+        total = _db_state(con)[0]
+        known = set(sidecar["ids"])
+        if not fresh and len(known) + len({row[1] for row in rows} - known) != total:
+            fresh, sidecar = True, dict(blank)
+            rows = changed_rows(con, 0, 0)
+    finally:
+        con.close()
+
+    if not fresh and not rows:
+        return 0
+
+    sidecar["generation"] = (old or {}).get("generation", 0) + 1
+    data_path = store_paths(db_file, sidecar["generation"])[0]
+    positions = {vid: i for i, vid in enumerate(sidecar["ids"])}
+    written   = 0
+    try:
+        if not fresh:
+            shutil.copyfile(old_path, data_path)
+        with open(data_path, "r+b" if not fresh else "wb") as f:
+            # Drop anything past the rows the sidecar knows about
+            f.truncate(sidecar["count"] * (sidecar["dim"] or 0) * 4)
+            for rowid, vid, dim, blob, l2_norm, version in rows:
+                if sidecar["dim"] is None:
+                    sidecar["dim"] = dim
+                elif dim != sidecar["dim"]:
+                    raise ValueError(f"Row {vid} has dim {dim}, store has dim {sidecar['dim']}")
+                if len(blob) != dim * 4:
+                    raise ValueError(f"Row {vid} is not float32 encoded, only float32 rows can be exported")
+                if vid in positions:
+                    f.seek(positions[vid] * dim * 4)
+                    sidecar["norms"][positions[vid]] = l2_norm
+                else:
+                    f.seek(0, os.SEEK_END)
+                    positions[vid] = len(sidecar["ids"])
+                    sidecar["ids"].append(vid)
+                    sidecar["norms"].append(l2_norm)
+                f.write(blob)
+                sidecar["last_rowid"]   = max(sidecar["last_rowid"], rowid)
+                sidecar["last_version"] = max(sidecar["last_version"], version)
+                written += 1
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(data_path):
+            os.remove(data_path)
+        raise
+
+    sidecar["count"] = len(sidecar["ids"])
+    _write_sidecar(meta_path, sidecar)
+
+    # Processes that still map the previous generation keep reading it until they reload, on
+    # platforms that refuse to remove a mapped file it is left for the next sync
+    if old_path and old_path != data_path and os.path.exists(old_path):
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    return written
+
+
+def open_mmap(db_file: str = DB_FILE) -> VectorIndex:
+    """
+    Opens the flat file read-only with np.memmap, nothing is copied into the process. Every
+    worker mapping the same file shares one copy in the OS page cache.
+    """
+    _, meta_path = store_paths(db_file)
+    sidecar   = _read_sidecar(meta_path)
+    data_path = store_paths(db_file, sidecar.get("generation"))[0]
+    if not sidecar["count"]:
+        return VectorIndex([], np.empty((0, 0), dtype="float32"), np.empty(0, dtype="float32"))
+
+    matrix = np.memmap(data_path, dtype="float32", mode="r", shape=(sidecar["count"], sidecar["dim"]))
+    return VectorIndex(sidecar["ids"], matrix, np.asarray(sidecar["norms"], dtype="float32"))
+
+
+def mmap_is_current(db_file: str = DB_FILE) -> bool:
+    """
+    Whether the exported store still matches SQLite: same row count, nothing inserted or rewritten
+    since the last sync, and a flat file of the size the sidecar describes
+    """
+    _, meta_path = store_paths(db_file)
+    if not os.path.exists(meta_path):
+        return False
+    sidecar   = _read_sidecar(meta_path)
+    data_path = store_paths(db_file, sidecar.get("generation"))[0]
+    if not os.path.exists(data_path) or os.path.getsize(data_path) != sidecar["count"] * (sidecar["dim"] or 0) * 4:
+        return False
+
+    con = sqlite3.connect(db_file)
+    try:
+        state = _db_state(con)
+    except sqlite3.OperationalError:
+        # no vectors table (yet), nothing to compare against
+        return False
+    finally:
+        con.close()
+    return state == (sidecar["count"], sidecar["last_rowid"], sidecar.get("last_version", 0))
+
+
+def load_index(db_file: str = DB_FILE, filters: dict | None = None) -> VectorIndex | QuantizedIndex:
+    """
+    The memory-mapped store when it has been exported and is up to date with SQLite, otherwise
+    everything read out of SQLite. Filtered searches always go through SQLite so only the matching
+    rows are loaded. A store re-encoded by quantize.py convert is searched with QuantizedIndex.
+    """
+    if not filters and mmap_is_current(db_file):
+        return open_mmap(db_file)
+    try:
+        return VectorIndex.from_sqlite(db_file, filters)
+    except CompressedStoreError:
+        return QuantizedIndex.from_sqlite(db_file, filters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the vectors table to a memory-mappable flat file")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--rebuild", action="store_true", help="rewrite the file instead of appending new rows")
+    args = parser.parse_args()
+
+    written = sync_mmap(args.db, args.rebuild)
+    sidecar = _read_sidecar(store_paths(args.db)[1])
+    print(f"wrote {written} vectors to {store_paths(args.db, sidecar.get('generation'))[0]}")
+
+
+if __name__ == "__main__":
+    main()
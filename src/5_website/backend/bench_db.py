@@ -0,0 +1,107 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+from db import PRAGMAS, RECEIPTS_DDL, SUMMARY_DDL, STATS_SQL, rebuild_summaries
+
+RECEIPTS  = 1_000_000
+ITEMS     = 3        # average items per receipt
+STORES    = 500
+DAYS      = 730
+REPEATS   = 5
+
+# The sidebar query as it was before the summary tables, a full aggregate per rerun
+SCAN_STATS_SQL = '''
+    SELECT
+        (SELECT COUNT(*) FROM receipts),
+        (SELECT COUNT(*) FROM items),
+        (SELECT SUM(total_cost) FROM receipts),
+        (SELECT COUNT(DISTINCT store_name) FROM receipts)
+'''
+
+# (label, full scan query, query served by an index or summary table, params)
+QUERIES = [
+    ("spend at one store",
+     "SELECT SUM(total_cost) FROM receipts NOT INDEXED WHERE store_name = ?",
+     "SELECT SUM(total_cost) FROM receipts WHERE store_name = ?", ("Store 42",)),
+    ("spend in one month",
+     "SELECT SUM(total_cost) FROM receipts NOT INDEXED WHERE purchase_date BETWEEN ? AND ?",
+     "SELECT SUM(total_spent) FROM daily_totals WHERE purchase_date BETWEEN ? AND ?", ("2025-03-01", "2025-03-31")),
+    ("items of one receipt",
+     "SELECT item_name, item_cost FROM items NOT INDEXED WHERE receipt_id = ?",
+     "SELECT item_name, item_cost FROM items WHERE receipt_id = ?", (123_456,)),
+    ("spend per store",
+     "SELECT store_name, SUM(total_cost) FROM receipts NOT INDEXED GROUP BY store_name",
+     "SELECT store_name, total_spent FROM store_totals", ()),
+]
+
+
+def generate(conn, receipts: int, items: int, stores: int, days: int, batch: int = 50_000):
+    rng   = random.Random(0)
+    start = date(2024, 1, 1)
+    dates = [(start + timedelta(days=d)).isoformat() for d in range(days)]
+    receipt_id = 0
+    for offset in range(0, receipts, batch):
+        receipt_rows, item_rows = [], []
+        for _ in range(min(batch, receipts - offset)):
+            receipt_id += 1
+            costs = [rng.randint(5, 200) * 1000 for _ in range(rng.randint(1, 2 * items - 1))]
+            receipt_rows.append((receipt_id, f"Store {rng.randrange(stores)}", sum(costs), rng.choice(dates)))
+            item_rows.extend((receipt_id, f"Item {i}", cost) for i, cost in enumerate(costs))
+        conn.executemany("INSERT INTO receipts VALUES (?, ?, ?, ?)", receipt_rows)
+        conn.executemany("INSERT INTO items (receipt_id, item_name, item_cost) VALUES (?, ?, ?)", item_rows)
+        conn.commit()
+
+
+def timed(conn, sql: str, params=(), repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receipts schema at scale: summary tables and indexes vs full scans")
+    parser.add_argument("--receipts", type=int, default=RECEIPTS)
+    parser.add_argument("--stores", type=int, default=STORES)
+    parser.add_argument("--db", help="keep the generated database at this path instead of a temp file")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_receipts.db")
+    conn = sqlite3.connect(path)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.executescript(RECEIPTS_DDL)
+    conn.executescript(SUMMARY_DDL)
+    rebuild_summaries(conn)
+
+    t0 = time.perf_counter()
+    generate(conn, args.receipts, ITEMS, args.stores, DAYS)
+    load_s = time.perf_counter() - t0
+    print(f"{args.receipts:,} receipts inserted through the triggers in {load_s:.1f}s "
+          f"({args.receipts / load_s:,.0f} receipts/sec), db at {path}")
+
+    # The triggers must agree with a from-scratch aggregate
+    scanned = conn.execute(SCAN_STATS_SQL).fetchone()
+    summary = conn.execute(STATS_SQL).fetchone()
+    assert scanned[:2] == summary[:2] and scanned[3] == summary[3] and abs(scanned[2] - summary[2]) < 1e-6, \
+        (scanned, summary)
+
+    print(f"\n{'query':<24}{'full scan ms':>14}{'fast path ms':>14}{'speedup':>10}")
+    rows = [("sidebar stats", timed(conn, SCAN_STATS_SQL), timed(conn, STATS_SQL))]
+    for label, scan_sql, fast_sql, params in QUERIES:
+        rows.append((label, timed(conn, scan_sql, params), timed(conn, fast_sql, params)))
+    for label, scan_ms, fast_ms in rows:
+        print(f"{label:<24}{scan_ms:>14.2f}{fast_ms:>14.3f}{scan_ms / max(fast_ms, 1e-6):>9.0f}x")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import base64
+import os
+import random
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from image_prep import preprocess_image
+from db import DB_NAME, create_tables
+from utils import extract_receipt_data_from_image, insert_receipts
+
+WORKERS       = 4     # concurrent vision extractions
+BATCH_SIZE    = 20    # receipts per insert transaction
+POLL_SECONDS  = 5.0
+IMAGE_EXTS    = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def encode_image(image_bytes: bytes) -> str:
+    return base64.b64encode(image_bytes).decode('utf-8')
+
+
+def stub_extract(base64_image: str, mime_type: str = "image/jpeg", latency: float = 0.0) -> dict:
+    """
+    Offline stand-in for extract_receipt_data_from_image, returns a plausible receipt after latency seconds
+    """
+    if latency:
+        time.sleep(latency)
+    rng = random.Random(len(base64_image))
+    items = [{"item_name": f"Item {i}", "item_cost": rng.randint(5, 50) * 1000} for i in range(rng.randint(1, 5))]
+    return {
+        "store_name": rng.choice(["Indomaret Setiabudi", "RM Padang Pagi Sore", "Dunkin Cafe"]),
+        "total_cost": sum(item["item_cost"] for item in items),
+        "purchase_date": f"2025-09-{rng.randint(1, 28):02d}",
+        "items": items,
+    }
+
+
+def _extract_one(name: str, image, extract_fn) -> dict:
+    start = time.perf_counter()
+    prep  = {}
+    try:
+        # Paths and uploads are only read here, on the worker, so just the images in flight are in memory
+        if isinstance(image, str):
+            with open(image, 'rb') as f:
+                image = f.read()
+        elif hasattr(image, "getvalue"):
+            image = image.getvalue()
+        prepared = preprocess_image(image)
+        prep     = {"saved_bytes": prepared["saved_bytes"], "prep_seconds": prepared["seconds"]}
+        data     = extract_fn(encode_image(prepared["bytes"]), prepared["mime_type"])
+        return {"name": name, "status": "success", "data": data, "seconds": time.perf_counter() - start, **prep}
+    except Exception as e:
+        return {"name": name, "status": "error", "message": str(e), "seconds": time.perf_counter() - start, **prep}
+
+
+def process_images(images, extract_fn=extract_receipt_data_from_image, workers: int = WORKERS,
+                   batch_size: int = BATCH_SIZE, db_path: str = DB_NAME, on_progress=None) -> list:
+    """
+    Extracts many receipt images concurrently on a bounded pool and writes them in batched transactions.
+
+    images is a list of (name, image) where image is bytes, a path or a file-like upload. Paths and
+    uploads are read by the workers and at most 2 * workers images are submitted at a time, so
+    memory stays flat however many files there are.
+    on_progress(done, total, result) is called from the caller's thread as each receipt finishes.
+    Returns one result dict per image, a failed extraction or insert is reported on its own result
+    without stopping the others.
+    """
+    results, pending = [], []
+
+    def flush():
+        if not pending:
+            return
+        db_result = insert_receipts([r["data"] for r in pending], db_path)
+        if db_result["status"] != "success":
+            # One bad receipt rolls back the whole batch, retry one by one to isolate it
+            for r in pending:
+                single = insert_receipts([r["data"]], db_path)
+                if single["status"] != "success":
+                    r.update(status="error", message=single["message"])
+        pending.clear()
+
+    queue, in_flight = iter(images), set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            for name, image in queue:
+                in_flight.add(pool.submit(_extract_one, name, image, extract_fn))
+                if len(in_flight) >= 2 * workers:
+                    break
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                results.append(result)
+                if result["status"] == "success":
+                    pending.append(result)
+                    if len(pending) >= batch_size:
+                        flush()
+                if on_progress:
+                    on_progress(len(results), len(images), result)
+    flush()
+    return results
+
+
+def _list_images(directory: str):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTS) and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def _settled_images(directory: str, seen: dict):
+    """
+    Images whose size and mtime have not changed since the previous poll, files still being
+    written or copied in are left for a later poll. seen maps path -> (size, mtime) between polls.
+    """
+    settled, current = [], {}
+    for path in _list_images(directory):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        current[path] = (st.st_size, st.st_mtime_ns)
+        if st.st_size and seen.get(path) == current[path]:
+            settled.append(path)
+    seen.clear()
+    seen.update(current)
+    return settled
+
+
+def _archive_path(target: str, name: str) -> str:
+    # receipt.jpg, receipt-1.jpg, receipt-2.jpg, ... so an earlier file of the same name is kept
+    base, ext = os.path.splitext(name)
+    path, n = os.path.join(target, name), 0
+    while os.path.exists(path):
+        n += 1
+        path = os.path.join(target, f"{base}-{n}{ext}")
+    return path
+
+
+def _archive(directory: str, results):
+    """
+    Moves processed images to processed/ or failed/ so a watch never picks them up twice
+    """
+    for result in results:
+        target = os.path.join(directory, "processed" if result["status"] == "success" else "failed")
+        os.makedirs(target, exist_ok=True)
+        shutil.move(result["name"], _archive_path(target, os.path.basename(result["name"])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk receipt extraction into receipts.db")
+    parser.add_argument("paths", nargs="+", help="image files, or a single directory")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--watch", action="store_true", help="keep polling the directory for new images")
+    parser.add_argument("--stub", action="store_true", help="use the offline stub extractor, no API calls")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per extraction for --stub")
+    args = parser.parse_args()
+
+    extract_fn = extract_receipt_data_from_image
+    if args.stub:
+        extract_fn = lambda b64, mime_type: stub_extract(b64, mime_type, args.latency)
+
+    create_tables(args.db)
+
+    def on_progress(done, total, result):
+        status = "ok" if result["status"] == "success" else f"ERROR {result['message']}"
+        prep   = ""
+        if "saved_bytes" in result:
+            prep = f", {result['saved_bytes'] / 1024:,.0f} KB saved in {result['prep_seconds'] * 1000:.0f} ms"
+        print(f"[{done}/{total}] {result['name']} ({result['seconds']:.2f}s{prep}) {status}")
+
+    def run(paths):
+        start   = time.perf_counter()
+        results = process_images([(path, path) for path in paths], extract_fn, args.workers, args.batch_size, args.db, on_progress)
+        elapsed = time.perf_counter() - start
+        ok = sum(r["status"] == "success" for r in results)
+        print(f"{ok}/{len(results)} receipts inserted in {elapsed:.2f}s ({len(results) / elapsed:.1f} receipts/sec)")
+        return results
+
+    directory = args.paths[0] if len(args.paths) == 1 and os.path.isdir(args.paths[0]) else None
+    if directory is None:
+        run(args.paths)
+        return
+
+    seen = {}
+    while True:
+        paths = _settled_images(directory, seen) if args.watch else _list_images(directory)
+        if paths:
+            results = run(paths)
+            if args.watch:
+                _archive(directory, results)
+        if not args.watch:
+            break
+        time.sleep(POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import difflib
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_NAME   = 'receipts.db'
+POOL_SIZE = 8
+
+STORE_MATCH_CUTOFF = 0.75   # difflib ratio a misspelt store name needs to count as a match
+
+# WAL lets readers run alongside a writer instead of queueing behind the rollback journal lock,
+# synchronous=NORMAL is durable in WAL mode without an fsync per commit
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+RECEIPTS_DDL = '''
+    CREATE TABLE IF NOT EXISTS receipts (
+        receipt_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        store_name TEXT NOT NULL,
+        total_cost REAL NOT NULL,
+        purchase_date TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS items (
+        item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        receipt_id INTEGER,
+        item_name TEXT NOT NULL,
+        item_cost REAL NOT NULL,
+        FOREIGN KEY(receipt_id) REFERENCES receipts(receipt_id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_receipts_store_name    ON receipts (store_name);
+    CREATE INDEX IF NOT EXISTS idx_receipts_purchase_date ON receipts (purchase_date);
+    CREATE INDEX IF NOT EXISTS idx_items_receipt_id       ON items (receipt_id);
+'''
+
+# Spending summaries kept current by triggers, so the sidebar and the common questions never
+# aggregate over the whole receipts table. Rows whose count drops to zero are removed, which
+# keeps global_totals.store_count equal to COUNT(DISTINCT store_name).
+SUMMARY_DDL = '''
+    CREATE TABLE IF NOT EXISTS store_totals (
+        store_name TEXT PRIMARY KEY,
+        receipt_count INTEGER NOT NULL,
+        total_spent REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_store_totals_spent ON store_totals (total_spent);
+
+    CREATE TABLE IF NOT EXISTS daily_totals (
+        purchase_date TEXT PRIMARY KEY,
+        receipt_count INTEGER NOT NULL,
+        total_spent REAL NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS global_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        receipt_count INTEGER NOT NULL,
+        item_count INTEGER NOT NULL,
+        total_spent REAL NOT NULL,
+        store_count INTEGER NOT NULL
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_receipts_insert AFTER INSERT ON receipts BEGIN
+        UPDATE global_totals SET
+            receipt_count = receipt_count + 1,
+            total_spent = total_spent + NEW.total_cost,
+            store_count = store_count + NOT EXISTS (SELECT 1 FROM store_totals WHERE store_name = NEW.store_name)
+        WHERE id = 1;
+        INSERT INTO store_totals (store_name, receipt_count, total_spent) VALUES (NEW.store_name, 1, NEW.total_cost)
+            ON CONFLICT(store_name) DO UPDATE SET receipt_count = receipt_count + 1, total_spent = total_spent + excluded.total_spent;
+        INSERT INTO daily_totals (purchase_date, receipt_count, total_spent) VALUES (NEW.purchase_date, 1, NEW.total_cost)
+            ON CONFLICT(purchase_date) DO UPDATE SET receipt_count = receipt_count + 1, total_spent = total_spent + excluded.total_spent;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_receipts_delete AFTER DELETE ON receipts BEGIN
+        UPDATE store_totals SET receipt_count = receipt_count - 1, total_spent = total_spent - OLD.total_cost
+            WHERE store_name = OLD.store_name;
+        UPDATE daily_totals SET receipt_count = receipt_count - 1, total_spent = total_spent - OLD.total_cost
+            WHERE purchase_date = OLD.purchase_date;
+        UPDATE global_totals SET
+            receipt_count = receipt_count - 1,
+            total_spent = total_spent - OLD.total_cost,
+            store_count = store_count - EXISTS (SELECT 1 FROM store_totals WHERE store_name = OLD.store_name AND receipt_count = 0)
+        WHERE id = 1;
+        DELETE FROM store_totals WHERE store_name = OLD.store_name AND receipt_count = 0;
+        DELETE FROM daily_totals WHERE purchase_date = OLD.purchase_date AND receipt_count = 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_receipts_update AFTER UPDATE OF store_name, total_cost, purchase_date ON receipts BEGIN
+        UPDATE store_totals SET receipt_count = receipt_count - 1, total_spent = total_spent - OLD.total_cost
+            WHERE store_name = OLD.store_name;
+        UPDATE daily_totals SET receipt_count = receipt_count - 1, total_spent = total_spent - OLD.total_cost
+            WHERE purchase_date = OLD.purchase_date;
+        UPDATE global_totals SET
+            total_spent = total_spent - OLD.total_cost + NEW.total_cost,
+            store_count = store_count - EXISTS (SELECT 1 FROM store_totals WHERE store_name = OLD.store_name AND receipt_count = 0)
+        WHERE id = 1;
+        DELETE FROM store_totals WHERE store_name = OLD.store_name AND receipt_count = 0;
+        DELETE FROM daily_totals WHERE purchase_date = OLD.purchase_date AND receipt_count = 0;
+
+        UPDATE global_totals SET
+            store_count = store_count + NOT EXISTS (SELECT 1 FROM store_totals WHERE store_name = NEW.store_name)
+        WHERE id = 1;
+        INSERT INTO store_totals (store_name, receipt_count, total_spent) VALUES (NEW.store_name, 1, NEW.total_cost)
+            ON CONFLICT(store_name) DO UPDATE SET receipt_count = receipt_count + 1, total_spent = total_spent + excluded.total_spent;
+        INSERT INTO daily_totals (purchase_date, receipt_count, total_spent) VALUES (NEW.purchase_date, 1, NEW.total_cost)
+            ON CONFLICT(purchase_date) DO UPDATE SET receipt_count = receipt_count + 1, total_spent = total_spent + excluded.total_spent;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_items_insert AFTER INSERT ON items BEGIN
+        UPDATE global_totals SET item_count = item_count + 1 WHERE id = 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_items_delete AFTER DELETE ON items BEGIN
+        UPDATE global_totals SET item_count = item_count - 1 WHERE id = 1;
+    END;
+'''
+
+REBUILD_SUMMARIES_SQL = '''
+    DELETE FROM store_totals;
+    DELETE FROM daily_totals;
+    DELETE FROM global_totals;
+    INSERT INTO store_totals SELECT store_name, COUNT(*), SUM(total_cost) FROM receipts GROUP BY store_name;
+    INSERT INTO daily_totals SELECT purchase_date, COUNT(*), SUM(total_cost) FROM receipts GROUP BY purchase_date;
+    INSERT INTO global_totals (id, receipt_count, item_count, total_spent, store_count)
+        SELECT 1,
+               (SELECT COUNT(*) FROM receipts),
+               (SELECT COUNT(*) FROM items),
+               (SELECT COALESCE(SUM(total_cost), 0) FROM receipts),
+               (SELECT COUNT(*) FROM store_totals);
+'''
+
+# Bumped by every row written to receipts or items, from this app or any other process. Caches
+# keyed on it are reused until the data actually changes.
+VERSION_DDL = '''
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);
+
+    CREATE TRIGGER IF NOT EXISTS trg_version_receipts_insert AFTER INSERT ON receipts BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_version_receipts_update AFTER UPDATE ON receipts BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_version_receipts_delete AFTER DELETE ON receipts BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_version_items_insert AFTER INSERT ON items BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_version_items_update AFTER UPDATE ON items BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_version_items_delete AFTER DELETE ON items BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END;
+'''
+
+STATS_SQL = '''
+    SELECT receipt_count, item_count, total_spent, store_count FROM global_totals WHERE id = 1
+'''
+
+
+class ConnectionPool:
+    """
+    A fixed number of long lived connections shared by the threads of one process. Connections
+    keep their prepared statement cache between uses, so repeated queries skip re-parsing.
+    """
+
+    def __init__(self, db_path: str = DB_NAME, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.size    = size
+        self._idle   = queue.LifoQueue()
+        self._opened = 0
+        self._lock   = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self, timeout: float = 30.0):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                return self._connect()
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn):
+        # Never hand out a connection with a half finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+
+_pools      = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str = DB_NAME) -> ConnectionPool:
+    """
+    One pool per database per process, a forked worker never reuses its parent's connections
+    """
+    key = (os.getpid(), os.path.abspath(db_path))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_path)
+        return _pools[key]
+
+@contextmanager
+def connection(db_path: str = DB_NAME):
+    with get_pool(db_path).connection() as conn:
+        yield conn
+
+def create_tables(db_path: str = DB_NAME):
+    with connection(db_path) as conn:
+        conn.executescript(RECEIPTS_DDL)
+        conn.executescript(SUMMARY_DDL)
+        conn.executescript(VERSION_DDL)
+        # First run on a database that predates the summaries, backfill them once
+        if conn.execute("SELECT 1 FROM global_totals WHERE id = 1").fetchone() is None:
+            rebuild_summaries(conn)
+        conn.commit()
+
+def rebuild_summaries(conn):
+    """
+    Recomputes every summary table from receipts/items, e.g. after bulk edits with triggers bypassed
+    """
+    conn.executescript("BEGIN;" + REBUILD_SUMMARIES_SQL + "COMMIT;")
+
+def get_stats(db_path: str = DB_NAME) -> dict:
+    """
+    Sidebar statistics in a single round trip
+    """
+    with connection(db_path) as conn:
+        total_receipts, total_items, total_spending, unique_stores = conn.execute(STATS_SQL).fetchone()
+    return {
+        "total_receipts": total_receipts,
+        "total_items": total_items,
+        "total_spending": total_spending,
+        "unique_stores": unique_stores,
+    }
+
+def get_data_version(db_path: str = DB_NAME) -> int:
+    with connection(db_path) as conn:
+        return conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+
+def get_store_names(db_path: str = DB_NAME) -> list:
+    with connection(db_path) as conn:
+        return [row[0] for row in conn.execute("SELECT store_name FROM store_totals")]
+
+def _key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+def _tokens(name: str) -> str:
+    # Words keyed like _key, space separated and padded so containment only matches whole words
+    return " " + " ".join(filter(None, (_key(word) for word in name.split()))) + " "
+
+def match_store(text: str, stores: list):
+    """
+    The known store name closest to text: exact ignoring case and punctuation, then whole-word
+    containment ("padang pagi sore" -> "RM Padang Pagi Sore"), then a close spelling
+    ("mcdonals" -> "McDonald's"). None when nothing or more than one store fits, so a question
+    goes to the LLM instead of being answered for the wrong store and a new receipt keeps its name.
+    """
+    text = re.sub(r"^the ", "", text.strip())
+    key  = _key(text)
+    if not key:
+        return None
+    keys = {_key(store): store for store in stores}
+    if key in keys:
+        return keys[key]
+
+    words     = _tokens(text)
+    contained = {store for store in stores if len(key) >= 3 and len(_key(store)) >= 3
+                 and (words in _tokens(store) or _tokens(store) in words)}
+    if contained:
+        return contained.pop() if len(contained) == 1 else None
+
+    close = difflib.get_close_matches(key, list(keys), n=2, cutoff=STORE_MATCH_CUTOFF)
+    return keys[close[0]] if len(close) == 1 else None
+
+def get_store_spending(db_path: str = DB_NAME) -> list:
+    """
+    (store_name, receipt_count, total_spent) per store, biggest spend first
+    """
+    with connection(db_path) as conn:
+        return conn.execute(
+            "SELECT store_name, receipt_count, total_spent FROM store_totals ORDER BY total_spent DESC"
+        ).fetchall()
+
+def get_spending_between(start_date: str, end_date: str, db_path: str = DB_NAME) -> tuple:
+    """
+    (receipt_count, total_spent) for purchase dates in [start_date, end_date], from the daily summary
+    """
+    with connection(db_path) as conn:
+        return conn.execute(
+            "SELECT COALESCE(SUM(receipt_count), 0), COALESCE(SUM(total_spent), 0) FROM daily_totals "
+            "WHERE purchase_date BETWEEN ? AND ?",
+            (start_date, end_date),
+        ).fetchone()
+
+def insert_receipt_rows(conn, receipt_row: tuple, item_rows) -> int:
+    """
+    Inserts one receipt and its items on conn, inside the caller's transaction. item_rows are
+    (item_name, item_cost) pairs. Returns the new receipt_id.
+    """
+    cursor = conn.execute(
+        "INSERT INTO receipts (store_name, total_cost, purchase_date) VALUES (?, ?, ?)",
+        receipt_row,
+    )
+    receipt_id = cursor.lastrowid
+    conn.executemany(
+        "INSERT INTO items (receipt_id, item_name, item_cost) VALUES (?, ?, ?)",
+        [(receipt_id, name, cost) for name, cost in item_rows],
+    )
+    return receipt_id
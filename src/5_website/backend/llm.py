@@ -0,0 +1,213 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
+
+REQUEST_TIMEOUT = 60.0    # seconds per attempt, vision extraction of a large receipt stays well below this
+MAX_RETRIES     = 4
+BACKOFF_BASE    = 0.5     # seconds, doubled per attempt before jitter
+BACKOFF_MAX     = 20.0
+MAX_CONCURRENCY = 8       # in-flight requests across every session and thread of the process
+STATS_KEEP      = 10000
+
+RETRYABLE = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class LLMUnavailable(Exception):
+    """
+    The model could not be reached after all retries, e.g. a sustained rate limit
+    """
+
+
+class LLMMetrics:
+    """
+    Latency, retries, errors and token usage per call name ("extract", "text_to_sql", ...)
+    """
+
+    def __init__(self, keep: int = STATS_KEEP):
+        self.keep  = keep
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, usage=None, retries: int = 0, error: bool = False):
+        with self._lock:
+            call = self.calls.setdefault(name, {"count": 0, "errors": 0, "retries": 0,
+                                                "input_tokens": 0, "output_tokens": 0, "latencies": []})
+            call["count"]   += 1
+            call["errors"]  += int(error)
+            call["retries"] += retries
+            if usage is not None:
+                call["input_tokens"]  += getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", 0) or 0
+                call["output_tokens"] += getattr(usage, "output_tokens", None) or getattr(usage, "completion_tokens", 0) or 0
+            call["latencies"].append(seconds * 1000)
+            if len(call["latencies"]) > self.keep:
+                del call["latencies"][: len(call["latencies"]) - self.keep]
+
+    def summary(self) -> dict:
+        with self._lock:
+            calls = {name: dict(call, latencies=sorted(call["latencies"])) for name, call in self.calls.items()}
+        summary = {}
+        for name, call in calls.items():
+            latencies = call.pop("latencies")
+            if latencies:
+                call["p50_ms"] = latencies[(len(latencies) - 1) // 2]
+                call["p99_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            summary[name] = call
+        return summary
+
+
+LLM_METRICS = LLMMetrics()
+
+
+class _Runtime:
+    """
+    One event loop on a daemon thread owns the async client, so its connection pool is reused by
+    every Streamlit script thread instead of each call opening its own connections
+    """
+
+    def __init__(self):
+        self.loop      = asyncio.new_event_loop()
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        self._client   = None
+        threading.Thread(target=self.loop.run_forever, name="openai-loop", daemon=True).start()
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Only ever touched from the loop thread
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=REQUEST_TIMEOUT, max_retries=0)
+        return self._client
+
+
+_runtime      = None
+_runtime_lock = threading.Lock()
+
+def runtime() -> _Runtime:
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = _Runtime()
+        return _runtime
+
+
+def _backoff(attempt: int, error: Exception) -> float:
+    """
+    Full jitter exponential backoff, never shorter than a Retry-After the API sent back
+    """
+    delay   = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        delay = max(delay, float(headers.get("retry-after", 0)))
+    except ValueError:
+        pass
+    return delay
+
+
+async def _request(name: str, method: str, kwargs: dict):
+    """
+    Calls client.<method>(**kwargs) with retries on transient errors. Returns (response, retries).
+    """
+    target = runtime().client
+    for part in method.split("."):
+        target = getattr(target, part)
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return await target(**kwargs), attempt
+        except RETRYABLE as e:
+            if attempt == MAX_RETRIES:
+                raise LLMUnavailable(f"{name}: the model is unavailable right now ({type(e).__name__}), please try again shortly.") from e
+            delay = _backoff(attempt, e)
+            print(f"{name}: {type(e).__name__}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def acall(name: str, method: str, **kwargs):
+    """
+    Awaitable API call, e.g. await acall("text_to_sql", "responses.create", model=..., input=...).
+    Waits for a slot of the global semaphore, so bursts queue up instead of tripping rate limits.
+    """
+    start = time.perf_counter()
+    async with runtime().semaphore:
+        try:
+            response, retries = await _request(name, method, kwargs)
+        except Exception:
+            LLM_METRICS.record(name, time.perf_counter() - start, error=True)
+            raise
+    LLM_METRICS.record(name, time.perf_counter() - start, getattr(response, "usage", None), retries)
+    return response
+
+
+def submit(coro):
+    """
+    Schedules a coroutine on the shared loop and returns a concurrent.futures.Future, so a script
+    thread can start independent calls and collect them later
+    """
+    return asyncio.run_coroutine_threadsafe(coro, runtime().loop)
+
+
+def run(coro):
+    """
+    Runs a coroutine on the shared loop and blocks the calling thread until it finishes
+    """
+    return submit(coro).result()
+
+
+def call(name: str, method: str, **kwargs):
+    return run(acall(name, method, **kwargs))
+
+
+def gather(*coros):
+    """
+    Runs independent coroutines concurrently and returns their results in order
+    """
+    async def _all():
+        return await asyncio.gather(*coros)
+    return run(_all())
+
+
+_DONE = object()
+
+def stream(name: str, method: str, **kwargs):
+    """
+    Streaming call consumed from synchronous code, yields the chunks as they arrive. The semaphore
+    slot is held while the response streams, and given back as soon as the stream ends or the
+    caller stops reading.
+    """
+    chunks = queue.Queue()
+
+    async def pump():
+        start, usage, retries = time.perf_counter(), None, 0
+        try:
+            async with runtime().semaphore:
+                response, retries = await _request(name, method, dict(kwargs, stream=True, stream_options={"include_usage": True}))
+                try:
+                    async for chunk in response:
+                        usage = getattr(chunk, "usage", None) or usage
+                        chunks.put(chunk)
+                finally:
+                    await response.close()
+            LLM_METRICS.record(name, time.perf_counter() - start, usage, retries)
+        except Exception as e:
+            LLM_METRICS.record(name, time.perf_counter() - start, retries=retries, error=True)
+            chunks.put(e)
+        finally:
+            chunks.put(_DONE)
+
+    future = submit(pump())
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # Also runs on GeneratorExit when the caller drops the generator early, cancelling the pump
+        # closes the HTTP stream and releases the slot instead of draining the rest of the answer
+        future.cancel()
@@ -0,0 +1,350 @@
+import argparse
+import calendar
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from db import DB_NAME, connection, match_store
+from utils import get_all_restaurant_names, normalize_question
+
+STATS_KEEP         = 10000  # latency samples kept per path
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+
+# A time phrase at the end of the question, with its preposition, e.g. "... from this month"
+PERIOD_RE = re.compile(
+    r"(?:\s+(?:from|in|during|for|of|on))?\s+(?P<period>today|yesterday|this week|last week|this month|last month"
+    r"|this year|last year|(?:the )?(?:last|past) \d+ days|\d{4}-\d{2}-\d{2}"
+    r"|(?:" + "|".join(MONTHS) + r")(?: \d{4})?)$"
+)
+
+PREFIX = r"^(?:show|list|get|give|find)(?: me)?(?: all)?(?: of)?(?: my)?(?: the)?"
+SPENT  = r"(?:what(?:'s| is) )?(?:the |my )?total(?: amount)?(?: of money)?(?: that)? i(?: have)? spent"
+HOW_MUCH = r"how much(?: money)? (?:did|have) i (?:spend|spent)"
+
+INTENTS = [
+    ("top_store", [
+        r"^(?:which|what) (?:store|restaurant|shop|place) (?:did|have|do) i spen[dt] (?:the )?most(?: money)?(?: at| in)?$",
+        r"^where (?:did|have|do) i spen[dt] (?:the )?most(?: money)?$",
+    ]),
+    ("store_total", [
+        SPENT + r" (?:at|in) (?P<store>.+)$",
+        HOW_MUCH + r" (?:at|in) (?P<store>.+)$",
+    ]),
+    ("total", [
+        SPENT + r"$",
+        HOW_MUCH + r"(?: in total| overall| altogether)?$",
+        r"^(?:what(?:'s| is) )?my total spending$",
+    ]),
+    ("receipts_over", [
+        PREFIX + r" receipts (?:with|where)(?: a| the)? total(?: cost)?(?: is)? (?P<op>over|above|more than|greater than|under|below|less than) (?:rp ?)?(?P<amount>[\d.,]+k?)$",
+    ]),
+    ("items", [
+        PREFIX + r" items(?: that)? i (?:bought|purchased)(?: (?:at|from) (?P<store>.+))?$",
+        r"^what (?:items )?did i (?:buy|purchase)(?: (?:at|from) (?P<store>.+))?$",
+    ]),
+    ("receipts", [
+        PREFIX + r" receipts(?: (?:from|at|for) (?P<store>.+))?$",
+    ]),
+]
+INTENTS = [(name, [re.compile(p) for p in patterns]) for name, patterns in INTENTS]
+
+
+class RouterStats:
+    """
+    Counts and latencies for questions answered by the fast path vs the LLM fallback
+    """
+
+    def __init__(self, keep: int = STATS_KEEP):
+        self.keep    = keep
+        self.samples = {"fast": [], "llm": []}
+        self._lock   = threading.Lock()
+
+    def record(self, path: str, seconds: float):
+        with self._lock:
+            samples = self.samples[path]
+            samples.append(seconds * 1000)
+            if len(samples) > self.keep:
+                del samples[: len(samples) - self.keep]
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {path: sorted(values) for path, values in self.samples.items()}
+        total   = sum(len(values) for values in samples.values())
+        summary = {"hit_rate": len(samples["fast"]) / total if total else 0.0}
+        for path, values in samples.items():
+            summary[path] = {"count": len(values)}
+            if values:
+                summary[path]["p50_ms"] = values[(len(values) - 1) // 2]
+                summary[path]["p99_ms"] = values[min(len(values) - 1, int(len(values) * 0.99))]
+        return summary
+
+
+ROUTER_STATS = RouterStats()
+
+
+def resolve_period(phrase: str, today: date | None = None):
+    """
+    (start, end, label) ISO date range for a time phrase, end inclusive
+    """
+    today = today or date.today()
+    if phrase == "today":
+        return today.isoformat(), today.isoformat(), " today"
+    if phrase == "yesterday":
+        day = today - timedelta(days=1)
+        return day.isoformat(), day.isoformat(), " yesterday"
+    if phrase in ("this week", "last week"):
+        start = today - timedelta(days=today.weekday())
+        if phrase == "last week":
+            start -= timedelta(days=7)
+            return start.isoformat(), (start + timedelta(days=6)).isoformat(), " last week"
+        return start.isoformat(), today.isoformat(), " this week"
+    if phrase == "this month":
+        return today.replace(day=1).isoformat(), today.isoformat(), " this month"
+    if phrase == "last month":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1).isoformat(), end.isoformat(), " last month"
+    if phrase == "this year":
+        return date(today.year, 1, 1).isoformat(), today.isoformat(), " this year"
+    if phrase == "last year":
+        return date(today.year - 1, 1, 1).isoformat(), date(today.year - 1, 12, 31).isoformat(), " last year"
+
+    days = re.match(r"(?:the )?(?:last|past) (\d+) days", phrase)
+    if days:
+        n = int(days.group(1))
+        return (today - timedelta(days=n - 1)).isoformat(), today.isoformat(), f" in the last {n} days"
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", phrase):
+        return phrase, phrase, f" on {phrase}"
+
+    # A month name, the most recent one unless a year is given
+    name, _, year = phrase.partition(" ")
+    month = MONTHS[name]
+    year  = int(year) if year else (today.year if month <= today.month else today.year - 1)
+    last  = calendar.monthrange(year, month)[1]
+    return date(year, month, 1).isoformat(), date(year, month, last).isoformat(), f" in {calendar.month_name[month]} {year}"
+
+
+def split_period(question: str):
+    """
+    Removes a trailing time phrase from a normalized question, returns (rest, period or None)
+    """
+    match = PERIOD_RE.search(question)
+    if not match:
+        return question, None
+    return question[: match.start()], resolve_period(match.group("period"))
+
+
+def parse_amount(text: str) -> float:
+    """
+    Rupiah amounts as typed: 50000, 50.000, 50,000 or 50k
+    """
+    multiplier = 1000 if text.endswith("k") else 1
+    text = re.sub(r"[.,](?=\d{3}(?!\d))", "", text.rstrip("k"))
+    return float(text.replace(",", ".")) * multiplier
+
+
+def render_sql(sql: str, params) -> str:
+    """
+    The query with its parameters inlined, for display only
+    """
+    parts = sql.split("?")
+    out   = [parts[0]]
+    for param, part in zip(params, parts[1:]):
+        out.append("'" + param.replace("'", "''") + "'" if isinstance(param, str) else str(param))
+        out.append(part)
+    return "".join(out)
+
+
+def _plural(n: int, word: str) -> str:
+    return f"{n} {word}" if n == 1 else f"{n} {word}s"
+
+
+def _where(conditions: list) -> str:
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def build_query(intent: str, match: re.Match, period, stores: list):
+    """
+    (sql, params, answer(rows) -> str) for a matched intent, None when it cannot be answered
+    locally (e.g. an unknown store), in which case the question goes to the LLM
+    """
+    label  = period[2] if period else ""
+    groups = match.groupdict()
+    store  = None
+    if groups.get("store"):
+        store = match_store(groups["store"], stores)
+        if store is None:
+            return None
+
+    conditions, params = [], []
+    if store:
+        conditions.append("store_name = ?")
+        params.append(store)
+    if period:
+        conditions.append("purchase_date BETWEEN ? AND ?")
+        params.extend(period[:2])
+
+    if intent == "top_store":
+        if period:
+            sql = ("SELECT store_name, COUNT(*) AS receipt_count, SUM(total_cost) AS total_spent FROM receipts"
+                   + _where(conditions) + " GROUP BY store_name ORDER BY total_spent DESC LIMIT 1")
+        else:
+            sql = "SELECT store_name, receipt_count, total_spent FROM store_totals ORDER BY total_spent DESC LIMIT 1"
+
+        def answer(rows):
+            if not rows:
+                return f"You have no receipts{label}."
+            row = rows[0]
+            return (f"You spent the most at {row['store_name']}{label}: Rp{row['total_spent']:,.2f} "
+                    f"across {_plural(row['receipt_count'], 'receipt')}.")
+        return sql, params, answer
+
+    if intent in ("store_total", "total"):
+        if period:
+            sql = ("SELECT COUNT(*) AS receipt_count, COALESCE(SUM(total_cost), 0) AS total_spent FROM receipts"
+                   + _where(conditions))
+        elif store:
+            sql = "SELECT receipt_count, total_spent FROM store_totals WHERE store_name = ?"
+        else:
+            sql = "SELECT receipt_count, total_spent FROM global_totals WHERE id = 1"
+        where = f" at {store}" if store else ""
+
+        def answer(rows):
+            row = rows[0] if rows else {"receipt_count": 0, "total_spent": 0}
+            if not row["receipt_count"]:
+                return f"You have no receipts{where}{label}."
+            return f"You spent Rp{row['total_spent']:,.2f}{where}{label}, across {_plural(row['receipt_count'], 'receipt')}."
+        return sql, params, answer
+
+    if intent == "receipts_over":
+        op = "<" if groups["op"] in ("under", "below", "less than") else ">"
+        conditions.append(f"total_cost {op} ?")
+        params.append(parse_amount(groups["amount"]))
+        sql = ("SELECT receipt_id, store_name, total_cost, purchase_date FROM receipts"
+               + _where(conditions) + " ORDER BY purchase_date DESC")
+        words = "under" if op == "<" else "over"
+
+        def answer(rows):
+            return f"Found {_plural(len(rows), 'receipt')} with a total {words} Rp{params[-1]:,.0f}{label}."
+        return sql, params, answer
+
+    if intent == "items":
+        conditions = [f"r.{c}" for c in conditions]
+        sql = ("SELECT r.purchase_date, r.store_name, i.item_name, i.item_cost "
+               "FROM receipts AS r JOIN items AS i ON i.receipt_id = r.receipt_id"
+               + _where(conditions) + " ORDER BY r.purchase_date DESC, i.item_id")
+        where = f" at {store}" if store else ""
+
+        def answer(rows):
+            if not rows:
+                return f"You did not buy any items{where}{label}."
+            return f"You bought {_plural(len(rows), 'item')}{where}{label}, Rp{sum(r['item_cost'] for r in rows):,.2f} in total."
+        return sql, params, answer
+
+    if intent == "receipts":
+        sql = ("SELECT receipt_id, store_name, total_cost, purchase_date FROM receipts"
+               + _where(conditions) + " ORDER BY purchase_date DESC")
+        where = f" from {store}" if store else ""
+
+        def answer(rows):
+            if not rows:
+                return f"You have no receipts{where}{label}."
+            return f"Found {_plural(len(rows), 'receipt')}{where}{label}, Rp{sum(r['total_cost'] for r in rows):,.2f} in total."
+        return sql, params, answer
+
+    return None
+
+
+def match_intent(question: str, stores: list):
+    """
+    (intent, sql, params, answer) for a question one of the templates understands, else None
+    """
+    rest, period = split_period(normalize_question(question))
+    for intent, patterns in INTENTS:
+        for pattern in patterns:
+            match = pattern.match(rest)
+            if match:
+                built = build_query(intent, match, period, stores)
+                return (intent, *built) if built else None
+    return None
+
+
+def route_query(question: str, db_path: str = DB_NAME):
+    """
+    Answers common question shapes from parameterized SQL with a templated reply, no model calls.
+    Returns a result shaped like execute_query's plus natural_language, or None to use the LLM.
+    """
+    try:
+        matched = match_intent(question, get_all_restaurant_names(db_path))
+        if matched is None:
+            return None
+        intent, sql, params, answer = matched
+
+        with connection(db_path) as conn:
+            cursor  = conn.execute(sql, params)
+            columns = [description[0] for description in cursor.description]
+            rows    = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        print(f"Router database error, falling back to the LLM: {e}")
+        return None
+
+    result = {
+        "status": "success",
+        "original_query": question,
+        "sql_query": render_sql(sql, params),
+        "natural_language": answer(rows),
+        "route": "fast",
+        "intent": intent,
+    }
+    if rows:
+        result["result"] = rows
+    else:
+        result["message"] = "Query executed, but no results were found."
+    return result
+
+
+EXAMPLES = [
+    "Show me all receipts from this month",
+    "What's the total amount I spent at McDonalds?",
+    "List all items I bought yesterday",
+    "Which store did I spend the most money at?",
+    "Show me receipts with total cost over Rp50000",
+    "How much did I spend last month?",
+    "how much did i spend at padang pagi sore in september",
+    "What items did I buy at Indomaret on 2025-09-01",
+    "Show me receipts from the last 7 days",
+    "Which of my purchases were vegetarian?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Which questions the fast path answers, and how quickly")
+    parser.add_argument("questions", nargs="*", default=EXAMPLES)
+    parser.add_argument("--db", default=DB_NAME)
+    args = parser.parse_args()
+
+    stats = RouterStats()
+    for question in args.questions:
+        start   = time.perf_counter()
+        result  = route_query(question, args.db)
+        elapsed = time.perf_counter() - start
+        if result is None:
+            stats.record("llm", elapsed)
+            print(f"[llm ] {question}")
+            continue
+        stats.record("fast", elapsed)
+        print(f"[fast] {question}  ({result['intent']}, {elapsed * 1000:.2f} ms)")
+        print(f"       {result['sql_query']}")
+        print(f"       {result['natural_language']}")
+
+    summary = stats.summary()
+    print(f"\nfast path hit rate {summary['hit_rate']:.0%} "
+          f"({summary['fast']['count']} fast, {summary['llm']['count']} to the LLM)")
+    if summary["fast"]["count"]:
+        print(f"fast path p50 {summary['fast']['p50_ms']:.2f} ms, p99 {summary['fast']['p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,183 @@
 import streamlit as st
 import sqlite3
 import base64
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
 import pandas as pd
-from utils import extract_receipt_data_from_image, execute_query, normalize_response
+from db import DB_NAME, create_tables, get_data_version, get_pool, get_stats
+from utils import extract_receipt_data_from_image, execute_query, insert_receipt, normalize_response_stream, template_response
+from bulk_upload import process_images
+from image_prep import preprocess_image
+from router import ROUTER_STATS, route_query
+from llm import LLM_METRICS
 from PIL import Image
 import io
 
-# Database setup
-DB_NAME = 'receipts.db'
+VERSION_TTL      = 5.0   # seconds a rerun trusts the last seen data version, writes made here clear it at once
+QUERY_CACHE_MAX  = 200
+
+class QueryFailed(Exception):
+    """Raised inside the cached query so failed results are never cached"""
+    def __init__(self, result):
+        super().__init__(result.get("message"))
+        self.result = result
+
+@st.cache_resource
+def init_database():
+    """Create the tables and open the connection pool once per server process, not on every rerun"""
+    create_tables(DB_NAME)
+    return get_pool(DB_NAME)
+
+@st.cache_data(ttl=VERSION_TTL, show_spinner=False)
+def data_version():
+    """Version counter bumped by every write to receipts/items, including other processes"""
+    return get_data_version(DB_NAME)
+
+def mark_written():
+    """Call after any write from this app so the next rerun sees the new version immediately"""
+    data_version.clear()
+
+@st.cache_data(show_spinner=False)
+def cached_stats(version):
+    return get_stats(DB_NAME)
+
+@st.cache_data(max_entries=QUERY_CACHE_MAX, show_spinner=False)
+def cached_query(query, version, today):
+    """today is part of the key, "this month" or "yesterday" mean something else tomorrow"""
+    result = handle_query(query)
+    if result["status"] != "success":
+        raise QueryFailed(result)
+    return result
+
+class AnswerCache:
+    """Least recently used streamed answers, shared by the session threads so every access takes the lock"""
+    def __init__(self, max_entries=QUERY_CACHE_MAX):
+        self.max_entries = max_entries
+        self._answers    = OrderedDict()
+        self._lock       = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._answers:
+                return None
+            self._answers.move_to_end(key)
+            return self._answers[key]
+
+    def put(self, key, text):
+        with self._lock:
+            self._answers[key] = text
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.max_entries:
+                self._answers.popitem(last=False)
+
+@st.cache_resource
+def paraphrase_cache():
+    """Streamed answers by (question, data version, date), shared by all sessions like cached_query"""
+    return AnswerCache()
 
 def create_database():
     """Create database tables if they don't exist"""
-    conn = None
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS receipts (
-                receipt_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                store_name TEXT NOT NULL,
-                total_cost REAL NOT NULL,
-                purchase_date TEXT NOT NULL
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS items (
-                item_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                receipt_id INTEGER,
-                item_name TEXT NOT NULL,
-                item_cost REAL NOT NULL,
-                FOREIGN KEY(receipt_id) REFERENCES receipts(receipt_id)
-            )
-        ''')
-        
-        conn.commit()
+        init_database()
         return True
     except sqlite3.Error as e:
         st.error(f"Database error: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 def handle_extract_receipt(uploaded_file):
     """Handle receipt extraction from uploaded image"""
     try:
         image_bytes = uploaded_file.read()
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+
+        # Downscaled, grayscale, cropped payload with its real MIME type instead of the raw upload
+        prepared = preprocess_image(image_bytes)
+        base64_image = base64.b64encode(prepared["bytes"]).decode('utf-8')
         
         with st.spinner("Extracting receipt data..."):
-            extracted_data = extract_receipt_data_from_image(base64_image)
+            extracted_data = extract_receipt_data_from_image(base64_image, prepared["mime_type"])
         
-        result = execute_query(f"Insert this receipt data into the database:\n\n {str(extracted_data)}")
+        # Structured output goes straight in with parameterized inserts, no text-to-SQL round trip
+        result = insert_receipt(extracted_data)
+        mark_written()
         
-        return {"status": "success", "data": extracted_data, "db_result": result}
+        return {"status": "success", "data": extracted_data, "db_result": result, "prep": prepared}
     
     except ValueError as e:
         return {"status": "error", "message": str(e)}
     except Exception as e:
         return {"status": "error", "message": f"Unexpected error: {e}"}
 
+def handle_bulk_extract(uploaded_files):
+    """Extract many receipts concurrently and insert them in batched transactions"""
+    progress = st.progress(0.0, text="Extracting receipts...")
+
+    def on_progress(done, total, result):
+        progress.progress(done / total, text=f"Extracted {done}/{total} receipts")
+
+    images  = [(f.name, f) for f in uploaded_files]
+    results = process_images(images, on_progress=on_progress)
+    progress.empty()
+    mark_written()
+    return results
+
 def handle_query(query):
     """Handle database query"""
     if not query.strip():
         return {"status": "error", "message": "Query cannot be empty"}
-    
-    ai_response      = execute_query(query)
-    natural_language = normalize_response(query, ai_response)
 
-    ai_response["natural_language"] = natural_language
+    # Common question shapes are answered from SQL templates, the two model calls are the fallback
+    start = time.perf_counter()
+    fast  = route_query(query)
+    if fast is not None:
+        ROUTER_STATS.record("fast", time.perf_counter() - start)
+        return fast
+    
+    # The paraphrase is not awaited here, the caller shows the table first and streams it after
+    ai_response = execute_query(query)
+    template    = template_response(ai_response)
+    if template is not None:
+        ai_response["natural_language"] = template
+    ai_response["route"] = "llm"
+    ROUTER_STATS.record("llm", time.perf_counter() - start)
     
     return ai_response
 
+def stream_answer(query, result, version):
+    """Streams the model's paraphrase of result token by token, or replays it if already generated"""
+    key    = (query.strip(), version, date.today().isoformat())
+    cache  = paraphrase_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        st.write(cached)
+        return
+
+    ai_input = {k: result[k] for k in ("status", "result", "message", "original_query", "sql_query") if k in result}
+    try:
+        text = st.write_stream(normalize_response_stream(query, ai_input))
+    except Exception as e:
+        st.warning(f"Could not phrase the answer, the results are shown below: {e}")
+        return
+    cache.put(key, text)
+
+def run_query(query):
+    """
+    handle_query through a cache shared by all sessions, keyed on the question, the data version
+    and today's date, so repeating a question costs no SQL or LLM call until the receipts change
+    or the day does
+    """
+    query   = query.strip()
+    version = data_version()
+    try:
+        result = cached_query(query, version, date.today().isoformat())
+    except QueryFailed as e:
+        return e.result, version
+    if not result["sql_query"].strip().upper().startswith("SELECT"):
+        # A write, the version moved on and the cached copy of it will never be served again
+        mark_written()
+    return result, version
+
 def main():
     st.set_page_config(
         page_title="Receipt Processing App",
@@ -95,12 +199,33 @@ def main():
         st.header("Upload Receipt")
         st.markdown("Upload a food purchase receipt image to extract and store the data.")
         
-        uploaded_file = st.file_uploader(
-            "Choose a receipt image...",
+        uploaded_files = st.file_uploader(
+            "Choose receipt images...",
             type=['png', 'jpg', 'jpeg'],
-            help="Upload an image of your food purchase receipt"
+            accept_multiple_files=True,
+            help="Upload one or more images of your food purchase receipts"
         )
-        
+        uploaded_file = uploaded_files[0] if len(uploaded_files) == 1 else None
+
+        if len(uploaded_files) > 1:
+            st.markdown(f"**{len(uploaded_files)} receipts selected.**")
+
+            if st.button(">>Extract All Receipts<<", type="primary"):
+                results = handle_bulk_extract(uploaded_files)
+                succeeded = [r for r in results if r["status"] == "success"]
+                failed    = [r for r in results if r["status"] != "success"]
+
+                if succeeded:
+                    st.success(f"{len(succeeded)} of {len(results)} receipts processed and inserted!")
+                    st.dataframe(pd.DataFrame([
+                        {"File": r["name"], "Store Name": r["data"]["store_name"], "Total Cost": r["data"]["total_cost"],
+                         "Purchase Date": r["data"]["purchase_date"], "Items": len(r["data"].get("items") or [])}
+                        for r in succeeded
+                    ]), use_container_width=True)
+                if failed:
+                    st.error(f"{len(failed)} receipts failed:")
+                    st.dataframe(pd.DataFrame([{"File": r["name"], "Error": r["message"]} for r in failed]), use_container_width=True)
+
         if uploaded_file is not None:
             image = Image.open(uploaded_file)
             st.image(image, caption="Uploaded Receipt", use_column_width=True)
@@ -113,6 +238,12 @@ def main():
                 
                 if result["status"] == "success":
                     st.success("Receipt processed successfully!")
+
+                    prep = result["prep"]
+                    st.caption(
+                        f"Image payload {prep['original_bytes'] / 1024:,.0f} KB -> {len(prep['bytes']) / 1024:,.0f} KB "
+                        f"({prep['saved_bytes'] / 1024:,.0f} KB saved, preprocessed in {prep['seconds'] * 1000:.0f} ms)"
+                    )
                     
                     # Display extracted data
                     data = result["data"]
@@ -180,7 +311,7 @@ def main():
         if st.button("🔍 Execute Query", type="primary"):
             if query.strip():
                 with st.spinner("Processing query..."):
-                    result = handle_query(query)
+                    result, version = run_query(query)
                 
                 if result["status"] == "success":
                     st.success("Query executed successfully!")
@@ -189,11 +320,12 @@ def main():
                     with st.expander("Query Details"):
                         st.write(f"**Original Query:** {result['original_query']}")
                         st.write(f"**Generated SQL:** `{result['sql_query']}`")
+                        st.write(f"**Answered by:** {'SQL template (' + result['intent'] + ')' if result.get('route') == 'fast' else 'LLM'}")
                     
+                    # Reserved above the table, filled in once the table is already on screen
+                    answer_slot = st.container()
                     
                     # Display results
-                    st.write(result["natural_language"])
-                    
                     if "result" in result and result["result"]:
                         st.subheader("Results:")
                         results_df = pd.DataFrame(result["result"])
@@ -207,8 +339,14 @@ def main():
                             file_name="query_results.csv",
                             mime="text/csv"
                         )
-                    elif "message" in result:
+                    elif "message" in result and result["message"] != result.get("natural_language"):
                         st.info(result["message"])
+
+                    with answer_slot:
+                        if "natural_language" in result:
+                            st.write(result["natural_language"])
+                        else:
+                            stream_answer(query, result, version)
                         
                 else:
                     st.error(f" Error: {result['message']}")
@@ -221,35 +359,34 @@ def main():
         st.header("Database Statistics")
         
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            
-            # Informasi untuk Sidebar - Get total receipts
-            cursor.execute("SELECT COUNT(*) FROM receipts")
-            total_receipts = cursor.fetchone()[0]
-            
-            # Informasi untuk Sidebar -Get total items
-            cursor.execute("SELECT COUNT(*) FROM items")
-            total_items = cursor.fetchone()[0]
-            
-            # Informasi untuk Sidebar - Get total spending
-            cursor.execute("SELECT SUM(total_cost) FROM receipts")
-            total_spending = cursor.fetchone()[0] or 0
+            # Informasi untuk Sidebar - read from the summary tables once per data version, shared by all sessions
+            stats = cached_stats(data_version())
             
-            # Informasi untuk Sidebar - Get unique stores
-            cursor.execute("SELECT COUNT(DISTINCT store_name) FROM receipts")
-            unique_stores = cursor.fetchone()[0]
-            
-            st.metric("Total Receipts", total_receipts)
-            st.metric("Total Items", total_items)
-            st.metric("Total Spending", f"Rp{total_spending:,.2f}")
-            st.metric("Unique Stores", unique_stores)
-            
-            conn.close()
+            st.metric("Total Receipts", stats["total_receipts"])
+            st.metric("Total Items", stats["total_items"])
+            st.metric("Total Spending", f"Rp{stats['total_spending']:,.2f}")
+            st.metric("Unique Stores", stats["unique_stores"])
             
         except sqlite3.Error as e:
             st.error(f"Error fetching statistics: {e}")
         
+        routing = ROUTER_STATS.summary()
+        if routing["fast"]["count"] or routing["llm"]["count"]:
+            st.markdown("---")
+            st.markdown("**Query routing:**")
+            st.metric("Answered without the LLM", f"{routing['hit_rate']:.0%}")
+            for path, name in (("fast", "Fast path"), ("llm", "LLM")):
+                if routing[path]["count"]:
+                    st.caption(f"{name}: {routing[path]['count']} queries, p50 {routing[path]['p50_ms']:,.0f} ms, "
+                               f"p99 {routing[path]['p99_ms']:,.0f} ms")
+
+        calls = LLM_METRICS.summary()
+        if calls:
+            st.markdown("**OpenAI calls:**")
+            for name, call in calls.items():
+                st.caption(f"{name}: {call['count']} calls, p50 {call.get('p50_ms', 0):,.0f} ms, {call['retries']} retries, "
+                           f"{call['errors']} errors, {call['input_tokens'] + call['output_tokens']:,} tokens")
+
         st.markdown("---")
         st.markdown("**How to use:**")
         st.markdown("1. Upload a receipt image on the left")
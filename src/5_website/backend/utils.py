@@ -1,19 +1,22 @@
 import sqlite3
 import re
-import os
-from datetime import datetime
+import threading
+from datetime import datetime, date
+from hashlib import blake2b
 import json
-from openai import OpenAI
 from dotenv import load_dotenv
+import llm
+from db import DB_NAME, connection, create_tables, get_data_version, get_store_names, insert_receipt_rows, match_store
 
-DB_NAME = 'receipts.db'
+# Bump when the receipts/items DDL in the prompt changes, so cached SQL is not reused across schemas
+SCHEMA_VERSION = 1
+SQL_CACHE_MAX  = 500
+SQL_HITS_FLUSH = 50     # cache hits whose last_used is written back in one transaction
 
 load_dotenv()
 
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def extract_receipt_data_from_image(base64_image: str) -> dict:
+def extract_receipt_data_from_image(base64_image: str, mime_type: str = "image/jpeg") -> dict:
     try:
         prompt_text = """
         You are an intelligent receipt processing assistant. Your task is to analyze the
@@ -36,7 +39,9 @@ def extract_receipt_data_from_image(base64_image: str) -> dict:
         }
         """
 
-        response = client.chat.completions.create(
+        # Through the shared async client: timeout, jittered retries and the global concurrency limit
+        response = llm.call(
+            "extract", "chat.completions.create",
             model="gpt-5-mini",
             messages=[
                 {
@@ -46,7 +51,7 @@ def extract_receipt_data_from_image(base64_image: str) -> dict:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
+                                "url": f"data:{mime_type};base64,{base64_image}"
                             },
                         },
                     ],
@@ -69,37 +74,121 @@ def extract_receipt_data_from_image(base64_image: str) -> dict:
         raise
 
 
+_restaurant_names      = {}   # db_path -> (data version, names)
+_restaurant_names_lock = threading.Lock()
+
 def get_all_restaurant_names(db_path = DB_NAME):
-    conn = None
+    """
+    Distinct store names, cached in memory per data version. The version is bumped by a trigger on
+    every write, so inserts from other processes (bulk_upload.py, other app workers) are seen too.
+    """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-        sql_query = "SELECT DISTINCT store_name FROM receipts;"
-        
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
-        
-        restaurant_names = [row[0] for row in rows]
-        
-        return restaurant_names
+        version = get_data_version(db_path)
+        with _restaurant_names_lock:
+            cached = _restaurant_names.get(db_path)
+        if cached is not None and cached[0] == version:
+            return list(cached[1])
+
+        restaurant_names = get_store_names(db_path)
+        with _restaurant_names_lock:
+            _restaurant_names[db_path] = (version, restaurant_names)
+        return list(restaurant_names)
 
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         return [] 
 
-    finally:
-        if conn:
-            conn.close()
+def normalize_question(user_input: str) -> str:
+    """
+    Lowercase, collapse whitespace and drop trailing punctuation so trivially different phrasings share a cache entry
+    """
+    return " ".join(user_input.lower().split()).rstrip("?!. ")
+
+def sql_cache_key(user_input: str, restaurant_list: list) -> str:
+    """
+    The generated SQL depends on the question, the schema, the known stores and today's date
+    (the prompt resolves 'this month' / 'yesterday' against it), all of them go into the key
+    """
+    h = blake2b(digest_size=16)
+    h.update(f"{SCHEMA_VERSION}|{date.today().isoformat()}|".encode("utf-8"))
+    h.update(json.dumps(sorted(restaurant_list)).encode("utf-8"))
+    h.update(b"|")
+    h.update(normalize_question(user_input).encode("utf-8"))
+    return h.hexdigest()
+
+def _ensure_sql_cache(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sql_cache (
+            cache_key TEXT PRIMARY KEY,
+            question  TEXT NOT NULL,
+            sql_query TEXT NOT NULL,
+            last_used REAL NOT NULL
+        )
+    ''')
+
+_sql_cache_hits      = {}   # cache_key -> last hit, written back in batches instead of on every read
+_sql_cache_hits_lock = threading.Lock()
+
+def _flush_sql_cache_hits(conn):
+    with _sql_cache_hits_lock:
+        hits = list(_sql_cache_hits.items())
+        _sql_cache_hits.clear()
+    if hits:
+        conn.executemany("UPDATE sql_cache SET last_used = ? WHERE cache_key = ?", [(t, k) for k, t in hits])
+
+def get_cached_sql(cache_key: str):
+    try:
+        with connection() as conn:
+            _ensure_sql_cache(conn)
+            row = conn.execute("SELECT sql_query FROM sql_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+            if not row:
+                return None
+            with _sql_cache_hits_lock:
+                _sql_cache_hits[cache_key] = datetime.now().timestamp()
+                flush = len(_sql_cache_hits) >= SQL_HITS_FLUSH
+            if flush:
+                _flush_sql_cache_hits(conn)
+                conn.commit()
+            return row[0]
+    except sqlite3.Error as e:
+        print(f"SQL cache error: {e}")
+        return None
+
+def put_cached_sql(cache_key: str, user_input: str, sql_query: str):
+    """
+    Stores a generated query, evicting the least recently used entries beyond SQL_CACHE_MAX
+    """
+    try:
+        with connection() as conn:
+            _ensure_sql_cache(conn)
+            # Pending hits first, so the eviction below sees which entries are really in use
+            _flush_sql_cache_hits(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO sql_cache (cache_key, question, sql_query, last_used) VALUES (?, ?, ?, ?)",
+                (cache_key, normalize_question(user_input), sql_query, datetime.now().timestamp()),
+            )
+            conn.execute(
+                "DELETE FROM sql_cache WHERE cache_key NOT IN (SELECT cache_key FROM sql_cache ORDER BY last_used DESC LIMIT ?)",
+                (SQL_CACHE_MAX,),
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"SQL cache error: {e}")
 
 def text_to_sql(user_input: str) -> str:
     """
-    Text to SQL with OpenAIs GPT-5-mini
+    Text to SQL with OpenAIs GPT-5-mini, repeated read-only questions are served from sql_cache
     """
     
     restaurant_list = get_all_restaurant_names()
 
-    response = client.responses.create(
+    cache_key = sql_cache_key(user_input, restaurant_list)
+    cached    = get_cached_sql(cache_key)
+    if cached:
+        return cached
+
+    response = llm.call(
+        "text_to_sql", "responses.create",
         model="gpt-5-mini",
         input=[
             {
@@ -258,6 +347,10 @@ def text_to_sql(user_input: str) -> str:
 
     sql_query = data['query']
 
+    # Only reads are cached, replaying a cached write would insert the same data twice
+    if sql_query.strip().upper().startswith('SELECT'):
+        put_cached_sql(cache_key, user_input, sql_query)
+
     return sql_query
 
 def execute_query(query: str) -> dict:
@@ -266,48 +359,90 @@ def execute_query(query: str) -> dict:
         sql_query = text_to_sql(query)
         print(f"Generated SQL: {sql_query}")
 
-        conn = None
         try:
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-
-            # Case for SELECT Query
-            if sql_query.strip().upper().startswith('SELECT'):
-                cursor.execute(sql_query)
-                results = cursor.fetchall()
-
-                if not results:
-                    return {"status": "success", "message": "Query executed, but no results were found.", "original_query": query, "sql_query": sql_query}
-
-                column_names = [description[0] for description in cursor.description]
-                
-                # Format as a list of dictionaries for JSON output
-                json_results = [dict(zip(column_names, row)) for row in results]
-                json_return = {
-                    "status": "success",
-                    "result": json_results,
-                    "original_query": query,
-                    "sql_query": sql_query
-                }
-                return json_return
+            with connection() as conn:
+                cursor = conn.cursor()
+
+                # Case for SELECT Query
+                if sql_query.strip().upper().startswith('SELECT'):
+                    cursor.execute(sql_query)
+                    results = cursor.fetchall()
+
+                    if not results:
+                        return {"status": "success", "message": "Query executed, but no results were found.", "original_query": query, "sql_query": sql_query}
+
+                    column_names = [description[0] for description in cursor.description]
+                    
+                    # Format as a list of dictionaries for JSON output
+                    json_results = [dict(zip(column_names, row)) for row in results]
+                    json_return = {
+                        "status": "success",
+                        "result": json_results,
+                        "original_query": query,
+                        "sql_query": sql_query
+                    }
+                    return json_return
 
-            else:
-                cursor.executescript(sql_query)
-                conn.commit()
-                return {"status": "success", "original_query": query, "sql_query": sql_query, "message": "Action completed successfully. The database has been updated."}
+                else:
+                    cursor.executescript(sql_query)
+                    conn.commit()
+                    return {"status": "success", "original_query": query, "sql_query": sql_query, "message": "Action completed successfully. The database has been updated."}
 
         except sqlite3.Error as e:
             return {"status": "error", "original_query": query, "sql_query": sql_query, "message": f"A database error occurred: {e}"}
-        finally:
-            if conn:
-                conn.close()
 
     except Exception as e:
         return {"status": "error", "original_query": query, "message": f"An unexpected error occurred: {e}"}
 
-def normalize_response(user_input: str, ai_input: str) -> str:
+def _receipt_row(data: dict) -> tuple:
+    """
+    Validates one extract_receipt_data_from_image result into a receipts row
+    """
     try:
-        prompt_text = f"""
+        return (str(data["store_name"]).strip(), float(data["total_cost"]), str(data["purchase_date"]).strip())
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid receipt data: {e}")
+
+def _item_rows(data: dict) -> list:
+    try:
+        return [(str(item["item_name"]).strip(), float(item["item_cost"])) for item in data.get("items") or []]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid receipt item: {e}")
+
+def insert_receipts(receipts: list, db_path = DB_NAME) -> dict:
+    """
+    Inserts extracted receipts with parameterized statements in a single transaction,
+    no LLM round trip. Either every receipt is written or none is. A store name that matches a
+    known store ("Mcdonalds", "MCDONALD'S") is stored under the known spelling, so variants
+    don't show up as separate stores.
+    """
+    try:
+        # Validate everything before touching the database
+        rows = [(_receipt_row(data), _item_rows(data)) for data in receipts]
+        with connection(db_path) as conn:
+            with conn:
+                stores      = [row[0] for row in conn.execute("SELECT store_name FROM store_totals")]
+                receipt_ids = []
+                for (store_name, total, purchase_date), item_rows in rows:
+                    store_name = match_store(store_name, stores) or store_name
+                    if store_name not in stores:
+                        stores.append(store_name)
+                    receipt_ids.append(insert_receipt_rows(conn, (store_name, total, purchase_date), item_rows))
+        return {"status": "success", "receipt_ids": receipt_ids, "message": "Action completed successfully. The database has been updated."}
+
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except sqlite3.Error as e:
+        return {"status": "error", "message": f"A database error occurred: {e}"}
+
+def insert_receipt(data: dict, db_path = DB_NAME) -> dict:
+    return insert_receipts([data], db_path)
+
+SMALL_TABLE_ROWS = 5    # results up to this many rows are answered from a template, not paraphrased by the model
+MONEY_COLUMN     = re.compile(r"cost|spent|spending|amount|price", re.IGNORECASE)
+
+def _normalize_messages(user_input: str, ai_input) -> list:
+    prompt_text = f"""
         You are an intelligent receipt processing assistant. Your task is to answer the users question with the provided answer from your fellow agent,
 
         here is the knowledge given from your fellow AI agent, the knowledge below should be able to answer the users question, because it is derived
@@ -321,22 +456,27 @@ def normalize_response(user_input: str, ai_input: str) -> str:
         whose answer are not available in the data in which case try to not answer the question.
         """
 
-        response = client.chat.completions.create(
-            model="gpt-5-mini",
-            messages=[
-                {
-                    "role": "developer",
-                    "content": [
-                        {"type": "text", "text": prompt_text}
-                    ]
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": user_input}
-                    ],
-                }
+    return [
+        {
+            "role": "developer",
+            "content": [
+                {"type": "text", "text": prompt_text}
             ]
+        },
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": user_input}
+            ],
+        }
+    ]
+
+def normalize_response(user_input: str, ai_input: str) -> str:
+    try:
+        response = llm.call(
+            "normalize", "chat.completions.create",
+            model="gpt-5-mini",
+            messages=_normalize_messages(user_input, ai_input)
         )
 
         return_text = response.choices[0].message.content
@@ -346,3 +486,46 @@ def normalize_response(user_input: str, ai_input: str) -> str:
         print(f"Error OpenAI API: {e}")
         raise
 
+def normalize_response_stream(user_input: str, ai_input):
+    """
+    Same paraphrase as normalize_response, yielded piece by piece as the model produces it
+    """
+    try:
+        stream = llm.stream(
+            "normalize", "chat.completions.create",
+            model="gpt-5-mini",
+            messages=_normalize_messages(user_input, ai_input)
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    except Exception as e:
+        print(f"Error OpenAI API: {e}")
+        raise
+
+def _format_value(column: str, value) -> str:
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and MONEY_COLUMN.search(column):
+        return f"Rp{value:,.2f}"
+    return str(value)
+
+def template_response(result: dict):
+    """
+    The answer for results simple enough to phrase without the model: nothing found, a write,
+    a single value or a handful of rows (shown as a table next to it). None means paraphrase it.
+    """
+    if result.get("status") != "success":
+        return None
+    rows = result.get("result")
+    if not rows:
+        return result.get("message", "Query executed, but no results were found.")
+    if len(rows) > SMALL_TABLE_ROWS:
+        return None
+
+    if len(rows) == 1:
+        row = rows[0]
+        if len(row) == 1:
+            column, value = next(iter(row.items()))
+            return f"The answer is **{_format_value(column, value)}**."
+        return ", ".join(f"{column}: **{_format_value(column, value)}**" for column, value in row.items())
+    return f"Found {len(rows)} matching rows, shown in the table below."